@@ -0,0 +1,36 @@
+"""
+Gunicorn configuration for TTEdb.
+
+    gunicorn -c gunicorn.conf.py
+
+The application is loaded in the master before workers are forked
+(preload_app). With TTEDB_WARMUP enabled, the when_ready hook then
+imports the scientific stack and builds the analysis artifacts once in
+the master, before the workers are forked, so they are shared by all
+workers copy-on-write. TTEDB_WATCH_EXPORTS starts the export watcher in
+the master, so that workers pick up new analysis exports without a
+restart.
+"""
+import multiprocessing
+import os
+
+
+os.environ.setdefault('TTEDB_WARMUP', 'True')
+os.environ.setdefault('TTEDB_WATCH_EXPORTS', 'True')
+
+wsgi_app = 'ttedb_project.wsgi:application'
+bind = os.environ.get('GUNICORN_BIND', '127.0.0.1:8000')
+workers = int(os.environ.get('WEB_CONCURRENCY', multiprocessing.cpu_count() * 2 + 1))
+preload_app = True
+timeout = 60
+
+
+def when_ready(server):
+    from django.conf import settings
+
+    if settings.TTEDB_WARMUP:
+        from ttedb.warmup import warm_up
+        warm_up()
+    if settings.TTEDB_WATCH_EXPORTS:
+        from ttedb.watcher import start_watcher_thread
+        start_watcher_thread()
@@ -0,0 +1,202 @@
+"""
+Aggregation helpers for the analysis page.
+
+Each function answers one block of the analysis page with one or two
+queries, using conditional aggregates and GROUP BY instead of issuing a
+separate COUNT per year, range or category.
+"""
+from django.db.models import Count, Q
+from .models import TTEStudy, PICOComparison
+
+
+# Sample size bins used by the analysis page (label, min, max)
+SAMPLE_SIZE_RANGES = [
+    ('1-100', 1, 100),
+    ('101-500', 101, 500),
+    ('501-1000', 501, 1000),
+    ('1001-5000', 1001, 5000),
+    ('5001-10000', 5001, 10000),
+    ('10000+', 10001, 999999),
+]
+
+# Methodology groups used for the transparency breakdown
+METHODOLOGY_GROUPS = {
+    'dag_users': Q(dag=True),
+    'qba_users': Q(qba=True),
+    'both_users': Q(dag=True, qba=True),
+}
+
+# Non-empty transparency fields
+TRANSPARENCY_FIELDS = {
+    'protocol': Q(protocol__isnull=False) & ~Q(protocol=''),
+    'data': Q(data_url__isnull=False) & ~Q(data_url=''),
+    'code': Q(code_url__isnull=False) & ~Q(code_url=''),
+}
+
+
+def percentage(count, total):
+    """Return count as a percentage of total, or 0 for an empty total"""
+    return (count / total) * 100 if total > 0 else 0
+
+
+def methodology_timeline():
+    """DAG/QBA usage per publication year in a single GROUP BY query"""
+    rows = TTEStudy.objects.order_by().values('year').annotate(
+        total=Count('id'),
+        dag_count=Count('id', filter=Q(dag=True)),
+        qba_count=Count('id', filter=Q(qba=True)),
+        both_count=Count('id', filter=Q(dag=True, qba=True)),
+    ).order_by('year')
+
+    return [
+        {
+            'year': row['year'],
+            'dag_percentage': percentage(row['dag_count'], row['total']),
+            'qba_percentage': percentage(row['qba_count'], row['total']),
+            'both_percentage': percentage(row['both_count'], row['total']),
+        }
+        for row in rows if row['total'] > 0
+    ]
+
+
+def sample_size_distribution():
+    """Binned sample size counts computed as one conditional aggregate"""
+    aggregates = {
+        f'range_{index}': Count('id', filter=(
+            Q(n_trt__gte=min_size, n_trt__lte=max_size) |
+            Q(n_ctrl__gte=min_size, n_ctrl__lte=max_size)
+        ))
+        for index, (_, min_size, max_size) in enumerate(SAMPLE_SIZE_RANGES)
+    }
+    counts = TTEStudy.objects.aggregate(**aggregates)
+
+    return [
+        {'range': range_label, 'count': counts[f'range_{index}']}
+        for index, (range_label, _, _) in enumerate(SAMPLE_SIZE_RANGES)
+    ]
+
+
+def transparency_and_methodology():
+    """
+    Transparency and methodology metrics for all studies and for each
+    methodology group, computed in a single aggregate query.
+    """
+    aggregates = {'total': Count('id')}
+    for field, has_field in TRANSPARENCY_FIELDS.items():
+        aggregates[f'with_{field}'] = Count('id', filter=has_field)
+    for group, in_group in METHODOLOGY_GROUPS.items():
+        aggregates[f'{group}_total'] = Count('id', filter=in_group)
+        for field, has_field in TRANSPARENCY_FIELDS.items():
+            aggregates[f'{group}_with_{field}'] = Count('id', filter=in_group & has_field)
+
+    counts = TTEStudy.objects.aggregate(**aggregates)
+    total_studies = counts['total']
+
+    transparency_by_methodology = {}
+    for group in METHODOLOGY_GROUPS:
+        group_total = counts[f'{group}_total']
+        transparency_by_methodology[group] = {
+            'total': group_total,
+            'with_protocol': counts[f'{group}_with_protocol'],
+            'with_data': counts[f'{group}_with_data'],
+            'with_code': counts[f'{group}_with_code'],
+            'protocol_percentage': percentage(counts[f'{group}_with_protocol'], group_total),
+            'data_percentage': percentage(counts[f'{group}_with_data'], group_total),
+            'code_percentage': percentage(counts[f'{group}_with_code'], group_total),
+        }
+
+    return {
+        'total_studies': total_studies,
+        'transparency_metrics': {
+            'protocol_percentage': percentage(counts['with_protocol'], total_studies),
+            'data_percentage': percentage(counts['with_data'], total_studies),
+            'code_percentage': percentage(counts['with_code'], total_studies),
+        },
+        'transparency_by_methodology': transparency_by_methodology,
+        'methodology_metrics': {
+            'dag_percentage': percentage(counts['dag_users_total'], total_studies),
+            'qba_percentage': percentage(counts['qba_users_total'], total_studies),
+            'both_percentage': percentage(counts['both_users_total'], total_studies),
+        },
+    }
+
+
+def effect_measure_timeline():
+    """Share of each effect measure per publication year from one GROUP BY query"""
+    rows = PICOComparison.objects.order_by().values(
+        'tte_study__year', 'effect_measure'
+    ).annotate(count=Count('id'))
+
+    by_year = {}
+    for row in rows:
+        measures = by_year.setdefault(row['tte_study__year'], {})
+        measures[row['effect_measure']] = row['count']
+
+    timeline = []
+    for year in sorted(by_year):
+        counts = by_year[year]
+        total_year = sum(counts.values())
+        timeline.append({
+            'year': year,
+            **{
+                effect_measure: percentage(counts.get(effect_measure, 0), total_year)
+                for effect_measure, _ in PICOComparison.EFFECT_MEASURES
+            }
+        })
+    return timeline
+
+
+def effect_measure_concordance():
+    """TTE vs RCT concordance rates per effect measure in one query"""
+    summaries = {
+        row['effect_measure']: row
+        for row in PICOComparison.objects.with_estimates().concordance_summary('effect_measure')
+    }
+
+    concordance = []
+    for effect_measure, _ in PICOComparison.EFFECT_MEASURES:
+        row = summaries.get(effect_measure)
+        if row and row['total_comparisons'] > 0:
+            concordance.append({
+                'measure': effect_measure,
+                'total_comparisons': row['total_comparisons'],
+                'ci_overlap_rate': row['ci_overlap_rate'],
+                'direction_concordance_rate': row['direction_concordance_rate'],
+            })
+    return concordance
+
+
+def disease_concordance():
+    """TTE vs RCT concordance rates per disease category in one query"""
+    rows = PICOComparison.objects.with_estimates().exclude(
+        tte_study__disease_category__isnull=True
+    ).exclude(
+        tte_study__disease_category__exact=''
+    ).concordance_summary('tte_study__disease_category')
+
+    return [
+        {
+            'disease_category': row['tte_study__disease_category'],
+            'total_comparisons': row['total_comparisons'],
+            'ci_overlap_rate': row['ci_overlap_rate'],
+            'direction_concordance_rate': row['direction_concordance_rate'],
+        }
+        for row in rows if row['total_comparisons'] > 0
+    ]
+
+
+def concordance_metrics():
+    """Overall TTE vs RCT concordance rates in one query"""
+    summary = PICOComparison.objects.with_estimates().concordance_summary()
+    overall_ci_overlap = summary['ci_overlap_rate']
+    overall_direction_concordance = summary['direction_concordance_rate']
+
+    return {
+        'total_comparisons': summary['total_comparisons'],
+        'overall_ci_overlap': overall_ci_overlap,
+        'overall_direction_concordance': overall_direction_concordance,
+        'high_concordance_rate': (
+            (overall_ci_overlap + overall_direction_concordance) / 2
+            if overall_ci_overlap and overall_direction_concordance else 0
+        ),
+    }
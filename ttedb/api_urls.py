@@ -9,12 +9,13 @@ router.register(r'learning-resources', api_views.LearningResourceViewSet)
 router.register(r'statistics', api_views.DatabaseStatisticViewSet)
 
 urlpatterns = [
-    path('', include(router.urls)),
-    
-    # Custom API endpoints
+    # Custom API endpoints (listed before the router so that its
+    # statistics/<pk>/ route does not capture statistics/overview/)
     path('statistics/overview/', api_views.statistics_overview, name='statistics_overview'),
     path('search/', api_views.search_api, name='search_api'),
     
+    path('', include(router.urls)),
+    
     # Bayesian Analysis API endpoints
     path('analysis/overview/', api_views.bayesian_analysis_overview, name='bayesian_analysis_overview'),
     path('analysis/export-summary/', api_views.export_summary, name='export_summary'),
@@ -22,4 +23,8 @@ urlpatterns = [
     path('analysis/descriptive/', api_views.descriptive_results, name='descriptive_results'),
     path('analysis/subgroup/', api_views.subgroup_analysis_results, name='subgroup_analysis_results'),
     path('analysis/forest-plot-data/', api_views.forest_plot_data, name='forest_plot_data'),
+    path('analysis/forest-plot/<str:effect_measure>/', api_views.forest_plot_columns, name='forest_plot_columns'),
+    path('analysis/influence/<str:effect_measure>/', api_views.influence_diagnostics, name='influence_diagnostics'),
+    path('analysis/cumulative/<str:effect_measure>/', api_views.cumulative_meta_analysis, name='cumulative_meta_analysis'),
+    path('analysis/resampling/', api_views.resampling_results, name='resampling_results'),
 ] 
\ No newline at end of file
@@ -1,21 +1,33 @@
 from rest_framework import viewsets, filters
-from rest_framework.decorators import api_view
+from rest_framework.decorators import action, api_view
+from rest_framework.pagination import LimitOffsetPagination
 from rest_framework.response import Response
 from django_filters.rest_framework import DjangoFilterBackend
-from django.db.models import Count
 from django.http import JsonResponse
-from django.conf import settings
-import json
-import os
 from .models import TTEStudy, PICOComparison, LearningResource, DatabaseStatistic
+from .statistics import STATISTIC_BUILDERS, load_statistics
+from .bulk_export import BulkExportMixin
+from .artifacts import MANIFEST_FILENAME, artifact_condition, load_artifact
+from .manifest import load_manifest
+from .precompressed import precompressed_response
+from .forest_plots import (
+    EFFECT_MEASURES, FOREST_DATA_FILES, FOREST_ROW_FILES, data_fingerprint, forest_rows_filename,
+    get_forest_plot_columns, load_forest_columns, load_forest_data, pooled_meta_results
+)
+from .cumulative import CUMULATIVE_STEPS, cumulative_columns
+from .forest_query import is_query, parse_filters, parse_ordering, row_dicts, select_rows
+from .influence import influence_columns
+from .meta_analysis import METHODS
+from .resampling import RESAMPLING_RESULTS_FILENAME
+from .subgroups import SUBGROUP_RESULT_FILES, subgroup_results_filename
 from .serializers import (
     TTEStudySerializer, PICOComparisonSerializer, 
     LearningResourceSerializer, DatabaseStatisticSerializer
 )
 
 
-class TTEStudyViewSet(viewsets.ReadOnlyModelViewSet):
-    """API viewset for TTE studies"""
+class TTEStudyViewSet(BulkExportMixin, viewsets.ReadOnlyModelViewSet):
+    """API viewset for TTE studies; export/ndjson/ and export/csv/ stream every matching study"""
     queryset = TTEStudy.objects.all().order_by('-year', 'first_author')
     serializer_class = TTEStudySerializer
     filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
@@ -23,16 +35,23 @@ class TTEStudyViewSet(viewsets.ReadOnlyModelViewSet):
     search_fields = ['first_author', 'disease', 'institution_names', 'target_trial_name']
     ordering_fields = ['year', 'first_author', 'created_at']
     lookup_field = 'slug'
+    export_filename = 'tte-studies'
 
 
-class PICOComparisonViewSet(viewsets.ReadOnlyModelViewSet):
-    """API viewset for PICO comparisons"""
+class PICOComparisonViewSet(BulkExportMixin, viewsets.ReadOnlyModelViewSet):
+    """API viewset for PICO comparisons; export/ndjson/ and export/csv/ stream every matching comparison"""
     queryset = PICOComparison.objects.all().select_related('tte_study')
     serializer_class = PICOComparisonSerializer
     filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
     filterset_fields = ['effect_measure', 'outcome_type', 'target_trial_name', 'tte_study__disease_category']
     search_fields = ['outcome', 'population', 'intervention', 'comparison', 'target_trial_name']
     ordering_fields = ['tte_study__year', 'target_trial_name', 'outcome']
+    export_filename = 'pico-comparisons'
+    export_related = {
+        'tte_study_slug': 'tte_study__slug',
+        'tte_study_author': 'tte_study__first_author',
+        'tte_study_year': 'tte_study__year',
+    }
 
 
 class LearningResourceViewSet(viewsets.ReadOnlyModelViewSet):
@@ -52,28 +71,34 @@ class DatabaseStatisticViewSet(viewsets.ReadOnlyModelViewSet):
     filter_backends = [DjangoFilterBackend]
     filterset_fields = ['statistic_type']
 
+    @action(detail=False, url_path=r'blocks/(?P<statistic_type>[a-z_]+)')
+    def blocks(self, request, statistic_type=None):
+        """Every block of one statistic type, from the snapshot (computed live if incomplete)"""
+        if statistic_type not in STATISTIC_BUILDERS:
+            return Response({'error': f'Unknown statistic type: {statistic_type}'}, status=404)
+        statistics, calculated_at = load_statistics([statistic_type])
+        return Response({**statistics, 'statistics_calculated_at': calculated_at})
+
 
 @api_view(['GET'])
 def statistics_overview(request):
     """API endpoint for overview statistics"""
-    # Get database statistics
+    # Serve the precomputed snapshot (computed live if no snapshot exists)
+    statistics, calculated_at = load_statistics(
+        ['overview', 'tte_general', 'disease_distribution']
+    )
     db_stats = {
-        'total_studies': TTEStudy.objects.count(),
-        'total_comparisons': PICOComparison.objects.count(),
-        'total_learning_resources': LearningResource.objects.count(),
-        'studies_by_year': list(
-            TTEStudy.objects.values('year').annotate(count=Count('id')).order_by('year')
-        ),
-        'studies_by_disease_category': list(
-            TTEStudy.objects.values('disease_category').annotate(count=Count('id')).order_by('-count')[:10]
-        ),
-        'studies_by_data_type': list(
-            TTEStudy.objects.values('data_type').annotate(count=Count('id')).order_by('-count')
-        ),
+        'total_studies': statistics['total_studies'],
+        'total_comparisons': statistics['total_comparisons'],
+        'total_learning_resources': statistics['total_learning_resources'],
+        'studies_by_year': statistics['publication_timeline'],
+        'studies_by_disease_category': statistics['disease_distribution'][:10],
+        'studies_by_data_type': statistics['data_type_distribution'],
+        'statistics_calculated_at': calculated_at,
     }
     
     # Add Bayesian analysis statistics if available
-    export_data = load_analysis_json('export_summary.json')
+    export_data = load_artifact('export_summary.json')
     if export_data:
         db_stats['bayesian_analysis'] = {
             'last_updated': export_data.get('export_timestamp'),
@@ -120,63 +145,154 @@ def search_api(request):
 # BAYESIAN ANALYSIS API ENDPOINTS
 # =============================================================================
 
-def load_analysis_json(filename):
-    """Helper function to load JSON files from ttedb/data directory"""
-    file_path = os.path.join(settings.BASE_DIR, 'ttedb', 'data', filename)
-    try:
-        with open(file_path, 'r') as f:
-            return json.load(f)
-    except FileNotFoundError:
-        return None
-    except json.JSONDecodeError:
+def precompressed_artifact(request, filename, key=None):
+    """
+    Pre-compressed body of an export for JSON clients, or None so that the
+    view renders the data itself (browsable API, missing variants).
+    """
+    if filename is None or request.accepted_renderer.format != 'json':
         return None
+    return precompressed_response(request, filename, key)
 
 
+@artifact_condition('export_summary.json')
 @api_view(['GET'])
 def export_summary(request):
     """API endpoint for export summary information"""
-    data = load_analysis_json('export_summary.json')
+    response = precompressed_artifact(request, 'export_summary.json')
+    if response is not None:
+        return response
+    
+    data = load_artifact('export_summary.json')
     if data is None:
         return Response({'error': 'Export summary data not available'}, status=404)
     return Response(data)
 
 
+@artifact_condition('meta_analysis_results.json', *FOREST_ROW_FILES)
 @api_view(['GET'])
 def meta_analysis_results(request):
-    """API endpoint for Bayesian meta-analysis results"""
-    data = load_analysis_json('meta_analysis_results.json')
+    """
+    API endpoint for Bayesian meta-analysis results.
+
+    With ?method=FE|DL|PM|REML, frequentist results pooled from the
+    forest plot data are returned instead, in the same schema.
+    """
+    method = request.GET.get('method')
+    if method:
+        method = method.upper()
+        if method not in METHODS:
+            return Response({'error': f'Unknown method: {method}. Use one of {", ".join(METHODS)}'}, status=400)
+        forest_columns = load_forest_columns()
+        columns_by_measure = {
+            measure: forest_columns[measure.lower()]
+            for measure in EFFECT_MEASURES if measure.lower() in forest_columns
+        }
+        return Response(pooled_meta_results(columns_by_measure, method))
+    
+    response = precompressed_artifact(request, 'meta_analysis_results.json')
+    if response is not None:
+        return response
+    
+    data = load_artifact('meta_analysis_results.json')
     if data is None:
         return Response({'error': 'Meta-analysis results not available'}, status=404)
     return Response(data)
 
 
+@artifact_condition('descriptive_results.json')
 @api_view(['GET'])
 def descriptive_results(request):
     """API endpoint for descriptive analysis results"""
-    data = load_analysis_json('descriptive_results.json')
+    response = precompressed_artifact(request, 'descriptive_results.json')
+    if response is not None:
+        return response
+    
+    data = load_artifact('descriptive_results.json')
     if data is None:
         return Response({'error': 'Descriptive results not available'}, status=404)
     return Response(data)
 
 
+@artifact_condition(*SUBGROUP_RESULT_FILES)
 @api_view(['GET'])
 def subgroup_analysis_results(request):
-    """API endpoint for subgroup analysis results"""
-    data = load_analysis_json('subgroup_analysis_results.json')
+    """
+    API endpoint for subgroup analysis results: the R export, or the
+    results derived from the database when those are newer
+    """
+    filename = subgroup_results_filename()
+    if filename is None:
+        return Response({'error': 'Subgroup analysis results not available'}, status=404)
+
+    response = precompressed_artifact(request, filename)
+    if response is not None:
+        return response
+    
+    data = load_artifact(filename)
     if data is None:
         return Response({'error': 'Subgroup analysis results not available'}, status=404)
     return Response(data)
 
 
+class ForestRowPagination(LimitOffsetPagination):
+    default_limit = 100
+    max_limit = 1000
+
+
+def forest_row_query(request):
+    """
+    Filtered, ordered page of forest plot rows across effect measures.
+
+    ?effect_measure=HR,OR  ?min_year=  ?max_year=  ?author= (substring)
+    ?disease= and ?target_trial= (case-insensitive)
+    ?ordering=year|author|estimate|sample_size|precision (prefix - for descending)
+    ?limit=  ?offset=
+    """
+    try:
+        filters = parse_filters(request.GET)
+        ordering = parse_ordering(request.GET.get('ordering'))
+    except ValueError as e:
+        return Response({'error': str(e)}, status=400)
+    
+    forest_columns = load_forest_columns()
+    requested = request.GET.get('effect_measure')
+    if requested:
+        measures = [measure.strip().upper() for measure in requested.split(',') if measure.strip()]
+    else:
+        measures = [measure.upper() for measure in forest_columns]
+    measure_ids, row_ids = select_rows(forest_columns, measures, filters, ordering)
+    
+    paginator = ForestRowPagination()
+    page = paginator.paginate_queryset(range(len(row_ids)), request)
+    return paginator.get_paginated_response(row_dicts(forest_columns, measure_ids[page], row_ids[page]))
+
+
+@artifact_condition(*FOREST_ROW_FILES)
 @api_view(['GET'])
 def forest_plot_data(request):
-    """API endpoint for forest plot data"""
-    data = load_analysis_json('forest_plot_data.json')
-    if data is None:
+    """
+    API endpoint for forest plot data (R export or derived from the database).
+
+    Returns the rows of every measure, or of ?effect_measure=, keyed by
+    measure; with any filter, ordering or paging parameter, a paginated
+    list of matching rows (see `forest_row_query`).
+    """
+    if is_query(request.GET):
+        return forest_row_query(request)
+    
+    effect_measure = request.GET.get('effect_measure')
+    response = precompressed_artifact(
+        request, forest_rows_filename(), effect_measure.lower() if effect_measure else None
+    )
+    if response is not None:
+        return response
+    
+    data, _ = load_forest_data()
+    if not data:
         return Response({'error': 'Forest plot data not available'}, status=404)
     
     # Optional filtering by effect measure
-    effect_measure = request.GET.get('effect_measure')
     if effect_measure and data:
         filtered_data = {k: v for k, v in data.items() if k.upper() == effect_measure.upper()}
         return Response(filtered_data)
@@ -184,36 +300,106 @@ def forest_plot_data(request):
     return Response(data)
 
 
+@artifact_condition(*FOREST_DATA_FILES)
+@api_view(['GET'])
+def forest_plot_columns(request, effect_measure):
+    """
+    API endpoint for the columnar forest plot data of one effect measure.
+
+    The analysis page requests it with ?v=<data fingerprint>, so responses
+    can be cached by the browser until the analysis exports change.
+    """
+    effect_measure = effect_measure.upper()
+    if effect_measure not in EFFECT_MEASURES:
+        return Response({'error': f'Unknown effect measure: {effect_measure}'}, status=404)
+    
+    response = Response(get_forest_plot_columns(effect_measure))
+    if request.GET.get('v') == data_fingerprint():
+        response['Cache-Control'] = 'public, max-age=86400'
+    return response
+
+
+@artifact_condition(*FOREST_ROW_FILES)
+@api_view(['GET'])
+def influence_diagnostics(request, effect_measure):
+    """
+    API endpoint for the leave-one-out and influence diagnostics of one
+    effect measure: one list per diagnostic, aligned with study_label
+    """
+    effect_measure = effect_measure.upper()
+    if effect_measure not in EFFECT_MEASURES:
+        return Response({'error': f'Unknown effect measure: {effect_measure}'}, status=404)
+    return Response(influence_columns(effect_measure))
+
+
+@artifact_condition(*FOREST_ROW_FILES)
+@api_view(['GET'])
+def cumulative_meta_analysis(request, effect_measure):
+    """
+    API endpoint for the cumulative meta-analysis of one effect measure:
+    the pooled estimate after each publication year, or after each
+    comparison with ?step=study. Requested with ?v=<rows fingerprint>,
+    so responses can be cached by the browser until the rows change.
+    """
+    effect_measure = effect_measure.upper()
+    if effect_measure not in EFFECT_MEASURES:
+        return Response({'error': f'Unknown effect measure: {effect_measure}'}, status=404)
+    step = request.GET.get('step', 'year')
+    if step not in CUMULATIVE_STEPS:
+        return Response({'error': f'Unknown step: {step}. Use one of {", ".join(CUMULATIVE_STEPS)}'}, status=400)
+    
+    response = Response(cumulative_columns(effect_measure, step))
+    if request.GET.get('v') == data_fingerprint(FOREST_ROW_FILES):
+        response['Cache-Control'] = 'public, max-age=86400'
+    return response
+
+
+@artifact_condition(RESAMPLING_RESULTS_FILENAME)
+@api_view(['GET'])
+def resampling_results(request):
+    """
+    API endpoint for the bootstrap heterogeneity CIs and the permutation
+    tests of subgroup differences written by `run_resampling_tests`
+    """
+    response = precompressed_artifact(request, RESAMPLING_RESULTS_FILENAME)
+    if response is not None:
+        return response
+    
+    data = load_artifact(RESAMPLING_RESULTS_FILENAME)
+    if data is None:
+        return Response({'error': 'Resampling results not available'}, status=404)
+    return Response(data)
+
+
+@artifact_condition(MANIFEST_FILENAME)
 @api_view(['GET'])
 def bayesian_analysis_overview(request):
-    """API endpoint for comprehensive Bayesian analysis overview"""
-    # Load all analysis files
-    export_data = load_analysis_json('export_summary.json')
-    meta_data = load_analysis_json('meta_analysis_results.json')
-    descriptive_data = load_analysis_json('descriptive_results.json')
-    subgroup_data = load_analysis_json('subgroup_analysis_results.json')
+    """
+    API endpoint for comprehensive Bayesian analysis overview, answered
+    from the manifest of the published exports
+    """
+    manifest = load_manifest()
     
     overview = {
-        'analysis_available': any([export_data, meta_data, descriptive_data, subgroup_data]),
-        'export_summary': export_data,
-        'meta_analysis_summary': {
-            'available_measures': list(meta_data.keys()) if meta_data else [],
-            'total_measures': len(meta_data) if meta_data else 0
-        },
-        'descriptive_summary': {
-            'overview': descriptive_data.get('overview') if descriptive_data else None
-        },
-        'subgroup_summary': {
-            'available_groupings': list(subgroup_data.keys()) if subgroup_data else [],
-            'total_subgroups': sum(len(v) for v in subgroup_data.values()) if subgroup_data else 0
-        },
+        'analysis_available': bool(manifest['files']),
+        'version': manifest['version'],
+        'files': manifest['files'],
+        'export_summary': manifest['export_summary'],
+        'meta_analysis_summary': manifest['meta_analysis_summary'],
+        'descriptive_summary': manifest['descriptive_summary'],
+        'subgroup_summary': manifest['subgroup_summary'],
+        'forest_plot_summary': manifest['forest_plot_summary'],
         'endpoints': {
             'export_summary': '/api/analysis/export-summary/',
             'meta_analysis': '/api/analysis/meta-analysis/',
             'descriptive': '/api/analysis/descriptive/',
             'subgroup': '/api/analysis/subgroup/',
             'forest_plot_data': '/api/analysis/forest-plot-data/',
+            'forest_plot': '/api/analysis/forest-plot/<effect_measure>/',
+            'influence': '/api/analysis/influence/<effect_measure>/',
+            'cumulative': '/api/analysis/cumulative/<effect_measure>/',
+            'resampling': '/api/analysis/resampling/',
         }
     }
     
-    return Response(overview) 
\ No newline at end of file
+    return Response(overview) 
@@ -0,0 +1,171 @@
+"""
+Versioned store for the R analysis exports.
+
+The R scripts write their exports to ttedb/data/, which is only a
+staging area once a version has been published: `publish_version()`
+validates the staged files, copies them and their manifest into a new
+immutable directory under ttedb/data/versions/ and then switches the ACTIVE pointer with a
+single atomic rename. Readers resolve the published exports through
+the pointer (see artifacts.data_path), so they always see one complete
+set of files, and every cache keyed on the exports' fingerprints moves
+to the new version with the pointer. `activate_version()` rolls back to
+any earlier version the same way.
+"""
+import hashlib
+import json
+import os
+import shutil
+from datetime import datetime, timezone
+
+from .artifacts import (
+    ACTIVE_VERSION_FILENAME, PUBLISHED_EXPORTS, VERSIONS_DIRNAME,
+    active_version, bump_generation, data_dir, version_dir
+)
+from .manifest import write_manifest
+
+
+# Exports every published version must contain
+REQUIRED_EXPORTS = ['export_summary.json', 'forest_plot_data.json', 'descriptive_results.json']
+
+FOREST_ROW_FIELDS = ['point_estimate', 'lower_ci', 'upper_ci']
+META_RESULT_FIELDS = ['pooled_estimate', 'ci_lower', 'ci_upper']
+
+
+def list_versions():
+    """Published versions, oldest first"""
+    versions_path = os.path.join(data_dir(), VERSIONS_DIRNAME)
+    if not os.path.isdir(versions_path):
+        return []
+    return sorted(
+        name for name in os.listdir(versions_path)
+        if not name.startswith('.') and os.path.isdir(os.path.join(versions_path, name))
+    )
+
+
+def _is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def _rows_problems(filename, data, fields):
+    """Problems with an export keyed by effect measure"""
+    problems = []
+    for measure, rows in data.items():
+        rows = rows if isinstance(rows, list) else [rows]
+        for i, row in enumerate(rows):
+            if not isinstance(row, dict):
+                problems.append(f'{filename}: {measure}[{i}] is not an object')
+                continue
+            missing = [field for field in fields if field not in row]
+            if missing:
+                problems.append(f"{filename}: {measure}[{i}] lacks {', '.join(missing)}")
+            elif all(_is_number(row[field]) for field in fields[1:]) and row[fields[1]] > row[fields[2]]:
+                problems.append(f'{filename}: {measure}[{i}] has its CI bounds reversed')
+    return problems
+
+
+def export_problems(source_dir):
+    """
+    Problems that keep the exports in source_dir from being published:
+    missing or unparsable files and rows the analysis pages cannot plot.
+    """
+    problems = []
+    exports = {}
+    for filename in PUBLISHED_EXPORTS:
+        path = os.path.join(source_dir, filename)
+        if not os.path.exists(path):
+            if filename in REQUIRED_EXPORTS:
+                problems.append(f'{filename}: missing')
+            continue
+        try:
+            with open(path, 'r') as f:
+                exports[filename] = json.load(f)
+        except (json.JSONDecodeError, UnicodeDecodeError) as e:
+            problems.append(f'{filename}: invalid JSON ({e})')
+            continue
+        if not isinstance(exports[filename], dict):
+            problems.append(f'{filename}: expected a JSON object')
+            del exports[filename]
+
+    # Files the export summary lists must be part of the same set
+    files_created = exports.get('export_summary.json', {}).get('files_created') or []
+    for created in ([files_created] if isinstance(files_created, str) else files_created):
+        filename = os.path.basename(created)
+        if filename in PUBLISHED_EXPORTS and not os.path.exists(os.path.join(source_dir, filename)):
+            problems.append(f'{filename}: listed in export_summary.json but not exported')
+
+    if 'forest_plot_data.json' in exports:
+        problems.extend(_rows_problems('forest_plot_data.json', exports['forest_plot_data.json'], FOREST_ROW_FIELDS))
+    if 'meta_analysis_results.json' in exports:
+        problems.extend(_rows_problems('meta_analysis_results.json', exports['meta_analysis_results.json'], META_RESULT_FIELDS))
+    return problems
+
+
+def exports_digest(source_dir):
+    """Content hash of the exports in source_dir"""
+    digest = hashlib.sha256()
+    for filename in PUBLISHED_EXPORTS:
+        path = os.path.join(source_dir, filename)
+        if os.path.exists(path):
+            digest.update(filename.encode())
+            with open(path, 'rb') as f:
+                digest.update(f.read())
+    return digest.hexdigest()[:8]
+
+
+def activate_version(version):
+    """Atomically point the served exports at a published version"""
+    if version not in list_versions():
+        raise ValueError(f'Unknown analysis version: {version}')
+
+    path = os.path.join(data_dir(), ACTIVE_VERSION_FILENAME)
+    temporary_path = f'{path}.{os.getpid()}.tmp'
+    with open(temporary_path, 'w') as f:
+        f.write(f'{version}\n')
+    os.replace(temporary_path, path)
+    bump_generation()
+
+
+def publish_version(source_dir=None):
+    """
+    Validate the exports in source_dir (ttedb/data by default), store them
+    as a new version and make it active.
+
+    Returns (version, published); published is False when the exports are
+    identical to the active version, which is then left in place.
+    Raises ValueError listing the problems when validation fails.
+    """
+    source_dir = source_dir or data_dir()
+    problems = export_problems(source_dir)
+    if problems:
+        raise ValueError('\n'.join(problems))
+
+    digest = exports_digest(source_dir)
+    current = active_version()
+    if current and current.endswith(f'-{digest}'):
+        return current, False
+
+    version = f"{datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%S%fZ')}-{digest}"
+    temporary_dir = os.path.join(data_dir(), VERSIONS_DIRNAME, f'.{version}.tmp')
+    os.makedirs(temporary_dir)
+    for filename in PUBLISHED_EXPORTS:
+        path = os.path.join(source_dir, filename)
+        if os.path.exists(path):
+            # copyfile gives the copy a fresh mtime, which Last-Modified relies on
+            shutil.copyfile(path, os.path.join(temporary_dir, filename))
+    write_manifest(temporary_dir, version)
+    os.replace(temporary_dir, version_dir(version))
+
+    activate_version(version)
+    return version, True
+
+
+def rollback_version(version=None):
+    """Reactivate the given version, or the one published before the active one"""
+    versions = list_versions()
+    if version is None:
+        current = active_version()
+        if current not in versions or versions.index(current) == 0:
+            raise ValueError('There is no earlier analysis version to roll back to')
+        version = versions[versions.index(current) - 1]
+    activate_version(version)
+    return version
@@ -0,0 +1,237 @@
+"""
+Shared loader for the analysis exports in ttedb/data/.
+
+The R exports are published into immutable version directories under
+ttedb/data/versions/ by the `publish_analysis` command, and the ACTIVE
+file names the version that is served (see artifact_store.py). Until a
+version is published the loose files in ttedb/data/ are served as
+before. Files derived in Django (the PICOComparison forest data, the
+compressed variants) always live in ttedb/data/.
+
+Parsed files are kept in an in-process cache keyed by path and
+invalidated when the file's modification time or size changes, so an
+unchanged export costs one stat() call per read instead of a disk read
+and a JSON parse. Copies that keep the old mtime and size are caught by
+the dataset generation counter, which drops all of these caches. Loaded
+objects are shared between requests and must not be mutated by callers.
+"""
+import glob
+import hashlib
+import json
+import os
+from datetime import datetime, timezone
+
+from django.conf import settings
+from django.views.decorators.http import condition
+
+
+# Exports written by the R scripts and published as versions
+PUBLISHED_EXPORTS = [
+    'export_summary.json',
+    'forest_plot_data.json',
+    'descriptive_results.json',
+    'meta_analysis_results.json',
+    'subgroup_analysis_results.json',
+]
+
+# Summary of a published version, written next to its exports (see manifest.py)
+MANIFEST_FILENAME = 'manifest.json'
+
+# Files resolved through the active version
+VERSIONED_FILES = PUBLISHED_EXPORTS + [MANIFEST_FILENAME]
+
+VERSIONS_DIRNAME = 'versions'
+ACTIVE_VERSION_FILENAME = 'ACTIVE'
+
+# Counter bumped whenever the exports change (see watcher.py)
+GENERATION_FILENAME = 'GENERATION'
+
+# path -> ((mtime_ns, size), parsed data)
+_artifact_memo = {}
+
+# (active version, filenames) -> (file (mtime, size) list, fingerprint)
+_fingerprint_memo = {}
+
+# ((mtime_ns, size) of the ACTIVE file, version name)
+_active_version_memo = [None, None]
+
+
+def reset_artifact_caches():
+    """Forget every parsed export, fingerprint and the active version"""
+    _artifact_memo.clear()
+    _fingerprint_memo.clear()
+    _active_version_memo[:] = [None, None]
+
+
+def dataset_generation():
+    """Current dataset generation, 0 before the exports first change"""
+    try:
+        with open(os.path.join(data_dir(), GENERATION_FILENAME), 'r') as f:
+            return int(f.read().strip() or 0)
+    except (FileNotFoundError, ValueError):
+        return 0
+
+
+def bump_generation():
+    """
+    Signal every worker that the exports changed, so that they drop their
+    in-process caches (see middleware.DatasetGenerationMiddleware), and
+    drop this process's caches right away. Returns the new generation.
+    """
+    generation = dataset_generation() + 1
+    path = os.path.join(data_dir(), GENERATION_FILENAME)
+    temporary_path = f'{path}.{os.getpid()}.tmp'
+    with open(temporary_path, 'w') as f:
+        f.write(f'{generation}\n')
+    os.replace(temporary_path, path)
+    reset_artifact_caches()
+    return generation
+
+
+def data_dir():
+    return os.path.join(settings.BASE_DIR, 'ttedb', 'data')
+
+
+def version_dir(version):
+    return os.path.join(data_dir(), VERSIONS_DIRNAME, version)
+
+
+def active_version():
+    """Name of the published version being served, or None before the first publish"""
+    try:
+        stat = os.stat(os.path.join(data_dir(), ACTIVE_VERSION_FILENAME))
+    except FileNotFoundError:
+        return None
+
+    stat = (stat.st_mtime_ns, stat.st_size)
+    if _active_version_memo[0] != stat:
+        with open(os.path.join(data_dir(), ACTIVE_VERSION_FILENAME), 'r') as f:
+            _active_version_memo[:] = [stat, f.read().strip() or None]
+    return _active_version_memo[1]
+
+
+def data_path(filename):
+    """
+    Absolute path of an analysis export: in the active version for the
+    published R exports and their manifest, in ttedb/data otherwise
+    """
+    if filename in VERSIONED_FILES:
+        version = active_version()
+        if version:
+            return os.path.join(version_dir(version), filename)
+    return os.path.join(data_dir(), filename)
+
+
+def artifact_filenames():
+    """Names of all JSON exports currently served"""
+    filenames = {os.path.basename(path) for path in glob.glob(os.path.join(data_dir(), '*.json'))}
+    if active_version():
+        filenames.difference_update(PUBLISHED_EXPORTS)
+        filenames.update(filename for filename in PUBLISHED_EXPORTS if file_stat(filename))
+    return sorted(filenames)
+
+
+def file_stat(filename):
+    """(mtime_ns, size) of an export, or None when it does not exist"""
+    try:
+        stat = os.stat(data_path(filename))
+    except FileNotFoundError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+def newest_artifact(filenames):
+    """The most recently written of several exports, or None when none exists"""
+    stats = [(file_stat(filename), filename) for filename in filenames]
+    existing = [(stat[0], filename) for stat, filename in stats if stat is not None]
+    return max(existing)[1] if existing else None
+
+
+def load_artifact(filename):
+    """Parsed JSON export, or None when it is missing or invalid"""
+    path = data_path(filename)
+    stat = file_stat(filename)
+    if stat is None:
+        _artifact_memo.pop(path, None)
+        return None
+
+    memo = _artifact_memo.get(path)
+    if memo is None or memo[0] != stat:
+        try:
+            with open(path, 'r') as f:
+                data = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+        memo = (stat, data)
+        _artifact_memo[path] = memo
+
+    return memo[1]
+
+
+def data_fingerprint(filenames):
+    """
+    Content hash of a set of exports.
+
+    The files are only re-hashed when their modification time or size
+    changes, so an unchanged dataset costs one stat() call per file.
+    """
+    filenames = tuple(filenames)
+    key = (active_version(), filenames)
+    stat = [(filename, file_stat(filename)) for filename in filenames]
+
+    memo = _fingerprint_memo.get(key)
+    if memo is None or memo[0] != stat:
+        digest = hashlib.sha256()
+        for filename in filenames:
+            digest.update(filename.encode())
+            try:
+                with open(data_path(filename), 'rb') as f:
+                    digest.update(f.read())
+            except FileNotFoundError:
+                digest.update(b'<missing>')
+        memo = (stat, digest.hexdigest()[:16])
+        _fingerprint_memo[key] = memo
+
+    return memo[1]
+
+
+def last_modified(filenames):
+    """
+    Latest modification time of a set of exports, or None when none exist.
+    Switching the active version counts as a modification of the
+    published exports, so a rollback is never answered with a 304.
+    """
+    stats = [stat for stat in map(file_stat, filenames) if stat is not None]
+    if not stats:
+        return None
+    mtimes = [mtime_ns for mtime_ns, _ in stats]
+    if active_version() and any(filename in VERSIONED_FILES for filename in filenames):
+        mtimes.append(os.stat(os.path.join(data_dir(), ACTIVE_VERSION_FILENAME)).st_mtime_ns)
+    return datetime.fromtimestamp(max(mtimes) / 1e9, tz=timezone.utc)
+
+
+def artifact_condition(*filenames):
+    """
+    Conditional GET for views that serve the given exports.
+
+    The strong ETag is the content fingerprint of the exports combined
+    with everything else that selects the representation (URL arguments,
+    query string, Accept and Accept-Encoding), and Last-Modified is the newest
+    file's mtime, so clients revalidating an unchanged export get an
+    empty 304. Views of missing exports are left unconditional.
+    """
+    def etag(request, *args, **kwargs):
+        if last_modified(filenames) is None:
+            return None
+        variant = '|'.join([
+            '/'.join(str(value) for value in kwargs.values()),
+            '&'.join(sorted(request.GET.urlencode().split('&'))),
+            request.META.get('HTTP_ACCEPT', ''),
+            request.META.get('HTTP_ACCEPT_ENCODING', ''),
+        ])
+        return f"{data_fingerprint(filenames)}-{hashlib.sha256(variant.encode()).hexdigest()[:8]}"
+
+    def modified(request, *args, **kwargs):
+        return last_modified(filenames)
+
+    return condition(etag_func=etag, last_modified_func=modified)
@@ -0,0 +1,324 @@
+"""
+NumPy sampler for the hierarchical meta-analysis model.
+
+The model is the one in bayesian_meta_model.stan, with a mean and a
+between-study SD per effect measure k:
+
+    mu[k] ~ normal(0, 1)
+    tau[k] ~ half-normal(0, 0.5)
+    theta[n] ~ normal(mu[measure[n]], tau[measure[n]])
+    y[n] ~ normal(theta[n], se[n])
+
+Every sweep of a chain is a blocked Gibbs update of all measures at once:
+tau by slice sampling log tau from its density with mu and theta
+integrated out (normal-normal, so it is closed form), then mu and theta
+from their conjugate normal conditionals. Integrating theta out of the
+tau update avoids the slow mixing of the centered parameterization when
+tau is small. Per-measure sums are `np.bincount`s over the studies, as
+in meta_analysis.py.
+
+Chains run in a process pool; `summaries()` reports the posterior means
+and 95% intervals in the schema of meta_analysis_results.json together
+with split R-hat and the bulk effective sample size. Incremental updates
+of a stored posterior are in posterior_update.py.
+"""
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+
+MU_PRIOR_SD = 1.0
+TAU_PRIOR_SD = 0.5
+
+METHOD = 'Bayesian hierarchical meta-analysis'
+
+DEFAULT_CHAINS = 4
+DEFAULT_WARMUP = 1000
+DEFAULT_DRAWS = 5000
+
+# Initial width, in log tau, of the slice sampler's interval, and the
+# most it is stepped out on each side
+SLICE_WIDTH = 1.0
+MAX_STEP_OUT = 20
+
+# Diagnostics above which a measure is reported as not converged
+RHAT_THRESHOLD = 1.01
+MIN_ESS = 400
+
+
+def _group_sum(group_index, values, n_groups):
+    return np.bincount(group_index, weights=values, minlength=n_groups)
+
+
+def log_tau_density(log_tau, group_index, effects, variances, n_groups):
+    """
+    Log posterior density of log tau for every measure, up to a
+    constant, with mu and theta integrated out.
+
+    Given tau, y[n] ~ normal(mu, se[n]² + tau²) and mu has a normal
+    prior, so the marginal likelihood of each measure is closed form.
+    """
+    tau_squared = np.exp(2 * log_tau)
+    total_variances = variances + tau_squared[group_index]
+    weights = 1.0 / total_variances
+    precision = 1.0 / MU_PRIOR_SD ** 2 + _group_sum(group_index, weights, n_groups)
+    weighted_sum = _group_sum(group_index, weights * effects, n_groups)
+    log_likelihood = -0.5 * (
+        _group_sum(group_index, np.log(total_variances) + weights * effects ** 2, n_groups)
+        - weighted_sum ** 2 / precision
+        + np.log(precision)
+    )
+    # Half-normal prior on tau and the Jacobian of tau = exp(log tau)
+    return log_likelihood - tau_squared / (2 * TAU_PRIOR_SD ** 2) + log_tau
+
+
+def slice_step(position, log_density, rng, width=SLICE_WIDTH):
+    """
+    One slice sampling update (stepping out, then shrinkage) of every
+    coordinate of `position`; `log_density` maps a vector of coordinates
+    to a vector of independent log densities.
+    """
+    level = log_density(position) - rng.exponential(size=position.shape)
+    lower = position - width * rng.uniform(size=position.shape)
+    upper = lower + width
+    for _ in range(MAX_STEP_OUT):
+        outside = log_density(lower) > level
+        if not outside.any():
+            break
+        lower = np.where(outside, lower - width, lower)
+    for _ in range(MAX_STEP_OUT):
+        outside = log_density(upper) > level
+        if not outside.any():
+            break
+        upper = np.where(outside, upper + width, upper)
+
+    updated = position.copy()
+    pending = np.ones(position.shape, dtype=bool)
+    while pending.any():
+        candidate = np.where(pending, rng.uniform(lower, upper), updated)
+        accepted = pending & (log_density(candidate) > level)
+        updated = np.where(accepted, candidate, updated)
+        pending &= ~accepted
+        below = candidate < position
+        lower = np.where(pending & below, candidate, lower)
+        upper = np.where(pending & ~below, candidate, upper)
+    return updated
+
+
+def sample_chain(effects, standard_errors, group_index, n_groups, warmup, draws, seed, initial_log_tau=None):
+    """
+    Run one chain, started from initial_log_tau when given. Returns the
+    post-warmup draws of mu and tau, each of shape (draws, n_groups), and
+    the posterior mean of theta.
+    """
+    rng = np.random.default_rng(seed)
+    variances = standard_errors ** 2
+
+    def log_density(log_tau):
+        return log_tau_density(log_tau, group_index, effects, variances, n_groups)
+
+    if initial_log_tau is None:
+        log_tau = rng.normal(np.log(TAU_PRIOR_SD / 2), 1.0, size=n_groups)
+    else:
+        log_tau = np.array(initial_log_tau, dtype=float)
+    mu_draws = np.empty((draws, n_groups))
+    tau_draws = np.empty((draws, n_groups))
+    theta_sum = np.zeros(len(effects))
+
+    for iteration in range(warmup + draws):
+        log_tau = slice_step(log_tau, log_density, rng)
+        tau_squared = np.exp(2 * log_tau)
+
+        # mu | tau, y
+        weights = 1.0 / (variances + tau_squared[group_index])
+        precision = 1.0 / MU_PRIOR_SD ** 2 + _group_sum(group_index, weights, n_groups)
+        mu = (_group_sum(group_index, weights * effects, n_groups) / precision
+              + rng.standard_normal(n_groups) / np.sqrt(precision))
+
+        # theta | mu, tau, y
+        theta_precision = 1.0 / variances + 1.0 / tau_squared[group_index]
+        theta = ((effects / variances + mu[group_index] / tau_squared[group_index]) / theta_precision
+                 + rng.standard_normal(len(effects)) / np.sqrt(theta_precision))
+
+        if iteration >= warmup:
+            mu_draws[iteration - warmup] = mu
+            tau_draws[iteration - warmup] = np.sqrt(tau_squared)
+            theta_sum += theta
+
+    return mu_draws, tau_draws, theta_sum / max(draws, 1)
+
+
+def run_chains(effects, standard_errors, groups, chains=DEFAULT_CHAINS, warmup=DEFAULT_WARMUP,
+               draws=DEFAULT_DRAWS, seed=None, workers=None, initial_log_tau=None):
+    """
+    Sample the posterior of every group with independent chains.
+
+    effects, standard_errors: 1-D arrays, one row per study estimate
+    groups: effect measure of every row
+    seed: seed of the whole run; each chain gets an independent stream
+    workers: processes to run the chains in (one per chain by default,
+    at most the number of CPUs); 1 runs them in this process
+    initial_log_tau: starting log tau of every chain, of shape (chains,
+    groups), to warm-start from a previous posterior
+
+    Returns a dict with the sorted unique `groups`, the draws of `mu`
+    and `tau` of shape (chains, draws, groups), the posterior mean of
+    `theta` for every row and the sampler settings.
+    """
+    effects = np.asarray(effects, dtype=float)
+    standard_errors = np.asarray(standard_errors, dtype=float)
+    group_ids, group_index = np.unique(np.asarray(groups), return_inverse=True)
+    n_groups = len(group_ids)
+
+    seeds = np.random.SeedSequence(seed).spawn(chains)
+    if initial_log_tau is None:
+        initial_log_tau = [None] * chains
+    arguments = [
+        (effects, standard_errors, group_index, n_groups, warmup, draws, chain_seed, initial)
+        for chain_seed, initial in zip(seeds, initial_log_tau)
+    ]
+    workers = workers or min(chains, os.cpu_count() or 1)
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(sample_chain, *zip(*arguments)))
+    else:
+        results = [sample_chain(*chain_arguments) for chain_arguments in arguments]
+
+    return {
+        'groups': group_ids,
+        'mu': np.stack([mu for mu, _, _ in results]),
+        'tau': np.stack([tau for _, tau, _ in results]),
+        'theta': np.mean([theta for _, _, theta in results], axis=0),
+        'chains': chains,
+        'warmup': warmup,
+        'draws': draws,
+        'warm_started': initial_log_tau[0] is not None,
+    }
+
+
+def split_rhat(draws):
+    """Split R-hat of draws of shape (chains, iterations)"""
+    half = draws.shape[1] // 2
+    if half < 2:
+        return float('nan')
+    split = np.concatenate([draws[:, :half], draws[:, -half:]])
+    within = split.var(axis=1, ddof=1).mean()
+    between = half * split.mean(axis=1).var(ddof=1)
+    if within == 0:
+        return 1.0
+    return float(np.sqrt(((half - 1) / half * within + between / half) / within))
+
+
+def effective_sample_size(draws):
+    """
+    Bulk effective sample size of draws of shape (chains, iterations),
+    from the FFT autocorrelations of the chains truncated with Geyer's
+    initial monotone sequence.
+    """
+    n_chains, n = draws.shape
+    if n < 4:
+        return float('nan')
+    centered = draws - draws.mean(axis=1, keepdims=True)
+    spectrum = np.fft.rfft(centered, n=2 * n, axis=1)
+    autocovariance = np.fft.irfft(spectrum * np.conj(spectrum), axis=1)[:, :n] / n
+
+    chain_variance = autocovariance[:, 0] * n / (n - 1)
+    within = chain_variance.mean()
+    variance = within * (n - 1) / n
+    if n_chains > 1:
+        variance += draws.mean(axis=1).var(ddof=1)
+    if variance == 0:
+        return float(n_chains * n)
+    rho = 1.0 - (within - autocovariance.mean(axis=0)) / variance
+    rho[0] = 1.0
+
+    pairs = rho[:-1:2] + rho[1::2]
+    negative = np.flatnonzero(pairs < 0)
+    if len(negative):
+        pairs = pairs[:negative[0]]
+    pairs = np.minimum.accumulate(pairs)
+    autocorrelation_time = -1.0 + 2.0 * pairs.sum()
+    return float(n_chains * n / max(autocorrelation_time, 1.0 / np.log10(n_chains * n)))
+
+
+def draws_summary(mu, tau, decimals=4):
+    """
+    Posterior mean and 95% interval of mu and the heterogeneity of one
+    measure. As in the R export, tau is the posterior mean of tau and
+    tau_squared its square.
+    """
+    lower, upper = np.quantile(mu, [0.025, 0.975])
+    tau_mean = float(np.mean(tau))
+    return {
+        'pooled_estimate': round(float(np.mean(mu)), decimals),
+        'ci_lower': round(float(lower), decimals),
+        'ci_upper': round(float(upper), decimals),
+        'tau_squared': round(tau_mean ** 2, decimals),
+        'tau': round(tau_mean, decimals),
+    }
+
+
+def sampler_description(result):
+    """How the draws of a `run_chains()` result were sampled, for the estimation field"""
+    warm_start = ' warm-started from the previous posterior' if result['warm_started'] else ''
+    return (
+        f"NumPy Gibbs/slice sampler with {result['chains']} chains{warm_start}, "
+        f"{result['warmup']} warmup + {result['draws']} sampling"
+    )
+
+
+def summaries(result, decimals=4):
+    """
+    Per-group summaries of a `run_chains()` result, keyed by group id, in
+    the schema of meta_analysis_results.json plus the convergence
+    diagnostics of mu and tau.
+    """
+    estimation = sampler_description(result)
+    summary = {}
+    for i, group in enumerate(result['groups']):
+        group = group.item() if hasattr(group, 'item') else group
+        mu = result['mu'][:, :, i]
+        tau = result['tau'][:, :, i]
+        summary[group] = {
+            **draws_summary(mu, tau, decimals),
+            'method': METHOD,
+            'estimation': estimation,
+            'rhat': round(max(split_rhat(mu), split_rhat(tau)), 3),
+            'ess': int(min(effective_sample_size(mu), effective_sample_size(tau))),
+        }
+    return summary
+
+
+def single_study_result(effect, standard_error, decimals=4):
+    """Result for a measure with one study: its own estimate, as in the R export"""
+    return {
+        'n_studies': 1,
+        'pooled_estimate': round(float(effect), decimals),
+        'ci_lower': round(float(effect - 1.96 * standard_error), decimals),
+        'ci_upper': round(float(effect + 1.96 * standard_error), decimals),
+        'tau_squared': 0,
+        'tau': 0,
+        'method': 'Single study analysis',
+        'estimation': 'Individual study estimate with 95% CI',
+    }
+
+
+def measure_studies(columns_by_measure):
+    """
+    (effects, standard errors) of the studies of every effect measure.
+
+    Standard errors are derived from the 95% CIs of the forest plot rows;
+    rows without a finite estimate and a positive standard error are
+    left out, and so are measures without any study.
+    """
+    from .meta_analysis import standard_errors_from_ci
+
+    studies = {}
+    for measure, columns in columns_by_measure.items():
+        effects = np.asarray(columns['point_estimate'], dtype=float)
+        standard_errors = standard_errors_from_ci(columns['lower_ci'], columns['upper_ci'])
+        valid = np.isfinite(effects) & np.isfinite(standard_errors) & (standard_errors > 0)
+        if valid.any():
+            studies[measure] = (effects[valid], standard_errors[valid])
+    return studies
@@ -0,0 +1,155 @@
+"""
+Cumulative meta-analysis of the TTE-RCT differences over publication time.
+
+The comparisons of an effect measure are ordered by publication year,
+and the DerSimonian-Laird pooled estimate is reported after each year
+(or after each comparison). Nothing is re-pooled from scratch: DL tau²
+only depends on the sums of w, w*y, w*y² and w², so every step's Q,
+tau² and I² come from running sums (`np.cumsum`). The random-effects
+estimates then reweight the comparisons published so far with each
+step's tau², in one masked (steps x comparisons) array pass done in
+blocks of steps.
+
+Results are memoized per measure and step for the forest rows
+fingerprint, so they are computed once per dataset version.
+"""
+import numpy as np
+
+from .meta_analysis import Z_95
+
+
+CUMULATIVE_STEPS = ['year', 'study']
+
+# Steps reweighted per block
+CUMULATIVE_BLOCK_STEPS = 1024
+
+CUMULATIVE_FIELDS = [
+    'n_studies', 'pooled_estimate', 'pooled_se', 'ci_lower', 'ci_upper', 'tau_squared', 'q_statistic', 'i_squared',
+]
+
+# (forest rows fingerprint, {(measure, step): cumulative result})
+_cumulative_memo = [None, {}]
+
+
+def cumulative_pooling(effects, standard_errors, ends, block_steps=CUMULATIVE_BLOCK_STEPS):
+    """
+    DL random-effects pooling of the first ends[i] rows, for every i.
+
+    effects, standard_errors: 1-D arrays in the order rows accumulate
+    ends: increasing row counts at which to report the pooled results
+
+    Returns a dict with one array per step for each of CUMULATIVE_FIELDS.
+    """
+    effects = np.asarray(effects, dtype=float)
+    variances = np.asarray(standard_errors, dtype=float) ** 2
+    ends = np.asarray(ends, dtype=int)
+    if not len(ends):
+        return {field: np.array([]) for field in CUMULATIVE_FIELDS}
+
+    # Q is shift invariant; centering keeps the running sums accurate
+    weights = 1.0 / variances
+    centered = effects - np.sum(weights * effects) / np.sum(weights)
+    weights_sum = np.cumsum(weights)[ends - 1]
+    weighted_sum = np.cumsum(weights * centered)[ends - 1]
+    weighted_squares = np.cumsum(weights * centered ** 2)[ends - 1]
+    weights_sq_sum = np.cumsum(weights ** 2)[ends - 1]
+
+    df = ends - 1
+    # A single row has Q = 0 exactly, not the rounding error of the running sums
+    q_statistic = np.where(df > 0, np.maximum(weighted_squares - weighted_sum ** 2 / weights_sum, 0.0), 0.0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        c = weights_sum - weights_sq_sum / weights_sum
+        tau_squared = np.maximum(np.where(c > 0, (q_statistic - df) / c, 0.0), 0.0)
+        i_squared = np.where(q_statistic > 0, np.maximum(0.0, (q_statistic - df) / q_statistic) * 100, 0.0)
+
+    # Random-effects estimates: the rows so far, reweighted with each step's tau²
+    random_weights_sum = np.empty(len(ends))
+    pooled_estimate = np.empty(len(ends))
+    for start in range(0, len(ends), block_steps):
+        steps = np.arange(start, min(start + block_steps, len(ends)))
+        n = ends[steps[-1]]
+        block = 1.0 / (variances[np.newaxis, :n] + tau_squared[steps, np.newaxis])
+        block[np.arange(n)[np.newaxis, :] >= ends[steps, np.newaxis]] = 0.0
+        random_weights_sum[steps] = block.sum(axis=1)
+        pooled_estimate[steps] = block @ effects[:n] / random_weights_sum[steps]
+    pooled_se = np.sqrt(1.0 / random_weights_sum)
+
+    return {
+        'n_studies': ends,
+        'pooled_estimate': pooled_estimate,
+        'pooled_se': pooled_se,
+        'ci_lower': pooled_estimate - Z_95 * pooled_se,
+        'ci_upper': pooled_estimate + Z_95 * pooled_se,
+        'tau_squared': tau_squared,
+        'q_statistic': q_statistic,
+        'i_squared': i_squared,
+    }
+
+
+def cumulative_meta_analysis(effect_measure, step='year'):
+    """
+    Cumulative pooled results of one effect measure's forest plot rows,
+    after each publication year or each comparison, computed once per
+    version of the rows export. Rows without a year or a valid CI are
+    left out.
+
+    Returns the results of `cumulative_pooling()` with the year and the
+    label of every step.
+    """
+    from .forest_plots import FOREST_ROW_FILES, data_fingerprint, load_forest_columns, measure_columns
+    from .meta_analysis import standard_errors_from_ci
+
+    if step not in CUMULATIVE_STEPS:
+        raise ValueError(f'Unknown cumulative step: {step!r}. Use one of {", ".join(CUMULATIVE_STEPS)}')
+
+    fingerprint = data_fingerprint(FOREST_ROW_FILES)
+    if _cumulative_memo[0] != fingerprint:
+        _cumulative_memo[:] = [fingerprint, {}]
+    results = _cumulative_memo[1]
+    if (effect_measure, step) in results:
+        return results[(effect_measure, step)]
+
+    columns = measure_columns(load_forest_columns(), effect_measure)
+    years = np.asarray(columns['year'], dtype=float)
+    effects = np.asarray(columns['point_estimate'], dtype=float)
+    standard_errors = standard_errors_from_ci(columns['lower_ci'], columns['upper_ci'])
+    rows = np.flatnonzero(np.isfinite(years) & np.isfinite(effects) & (standard_errors > 0))
+    # Stable, so comparisons of one year keep their display order
+    rows = rows[np.argsort(years[rows], kind='stable')]
+    years = years[rows].astype(int)
+
+    if step == 'year':
+        ends = np.flatnonzero(np.diff(years, append=years[-1] + 1 if len(years) else 0)) + 1
+        labels = [str(year) for year in years[ends - 1]]
+    else:
+        ends = np.arange(1, len(rows) + 1)
+        labels = np.asarray(columns['study_label'])[rows].tolist()
+
+    result = cumulative_pooling(effects[rows], standard_errors[rows], ends)
+    result.update({'year': years[ends - 1], 'label': labels})
+    results[(effect_measure, step)] = result
+    return result
+
+
+def cumulative_columns(effect_measure, step='year'):
+    """JSON-ready cumulative results of one effect measure, one list per field"""
+    from .forest_store import as_list
+
+    result = cumulative_meta_analysis(effect_measure, step)
+    step_name = 'publication year' if step == 'year' else 'study'
+    return {
+        'effect_measure': effect_measure,
+        'step': step,
+        'method': f'Random-effects (DerSimonian-Laird), cumulative by {step_name}',
+        'title': f'Cumulative {effect_measure} Difference by {step_name.title()}',
+        'axis_title': (
+            f"{effect_measure} Difference (Log Scale)" if effect_measure in ['HR', 'OR', 'RR']
+            else f"{effect_measure} Difference"
+        ),
+        'label': result['label'],
+        'year': as_list(result['year'], integer=True),
+        **{
+            field: as_list(np.asarray(result[field], dtype=float), integer=field == 'n_studies')
+            for field in CUMULATIVE_FIELDS
+        },
+    }
@@ -0,0 +1,160 @@
+"""
+Forest plot dataset derived directly from PICOComparison rows.
+
+Mirrors the data preparation of export_comprehensive_bayesian.R with
+NumPy array operations: TTE-RCT differences on the log scale for ratio
+measures and on the natural scale for RD/MD/SMD, standard errors from
+the 95% CI bounds, and removal of invalid rows and extreme outliers.
+The dataset is written to ttedb/data/ after each import, in the schema
+of the R-exported forest_plot_data.json.
+"""
+import json
+import os
+
+import numpy as np
+
+from .artifacts import bump_generation, data_path
+from .models import PICOComparison, PICOComparisonQuerySet
+
+
+FOREST_DATA_FILENAME = 'comparison_forest_data.json'
+
+# qnorm(0.975), used by the R export to derive SEs from the CI bounds
+Z_975 = 1.959963984540054
+
+# Rows more than this many SDs from their measure's mean are dropped, as in R
+OUTLIER_Z_SCORE = 5
+
+ESTIMATE_FIELDS = ['tte_estimate', 'tte_lb', 'tte_ub', 'rct_estimate', 'rct_lb', 'rct_ub']
+
+
+def comparison_columns():
+    """PICOComparison rows with both estimates as NumPy columns"""
+    rows = list(
+        PICOComparison.objects.filter(
+            **{f'{field}__isnull': False for field in ESTIMATE_FIELDS}
+        ).order_by('id').values_list(
+            'tte_study__slug', 'tte_study__first_author', 'tte_study__year',
+            'tte_study__disease_category', 'target_trial_name',
+            'tte_study__data_type', 'tte_study__n_trt', 'tte_study__n_ctrl', 'effect_measure',
+            *ESTIMATE_FIELDS
+        )
+    )
+    if not rows:
+        return None
+
+    study_ids, authors, years, diseases, target_trials, data_types, n_trt, n_ctrl, measures, *estimates = zip(*rows)
+    columns = {
+        'study_id': np.array(study_ids, dtype=object),
+        'author': np.array(authors, dtype=object),
+        'year': np.array(years, dtype=object),
+        'disease': np.array(diseases, dtype=object),
+        'target_trial_name': np.array(target_trials, dtype=object),
+        'data_type': np.array(data_types, dtype=object),
+        'n_trt': np.array(n_trt, dtype=float),
+        'n_ctrl': np.array(n_ctrl, dtype=float),
+        'effect_measure': np.array(measures, dtype=object),
+    }
+    for field, values in zip(ESTIMATE_FIELDS, estimates):
+        columns[field] = np.array(values, dtype=float)
+    return columns
+
+
+def differences(columns):
+    """
+    TTE-RCT differences, their SEs and a validity mask.
+
+    Ratio measures use log differences and log-scale SEs; difference
+    measures use the natural scale.
+    """
+    ratio = np.isin(columns['effect_measure'], PICOComparisonQuerySet.RATIO_MEASURES)
+    values = np.stack([columns[field] for field in ESTIMATE_FIELDS])
+    tte, tte_lb, tte_ub, rct, rct_lb, rct_ub = values
+
+    valid = (
+        np.all(np.isfinite(values), axis=0)
+        & (tte_lb < tte_ub) & (rct_lb < rct_ub)
+        & (tte_lb <= tte) & (tte <= tte_ub)
+        & (rct_lb <= rct) & (rct <= rct_ub)
+        & ~(ratio & np.any(values <= 0, axis=0))
+    )
+
+    # Log-transform ratio measures; invalid rows are masked out below
+    with np.errstate(divide='ignore', invalid='ignore'):
+        scaled = np.where(ratio, np.log(np.where(values > 0, values, np.nan)), values)
+    tte, tte_lb, tte_ub, rct, rct_lb, rct_ub = scaled
+
+    tte_se = (tte_ub - tte_lb) / (2 * Z_975)
+    rct_se = (rct_ub - rct_lb) / (2 * Z_975)
+    diff_estimate = tte - rct
+    diff_se = np.hypot(tte_se, rct_se)
+
+    valid &= np.isfinite(diff_estimate) & np.isfinite(diff_se) & (tte_se > 0) & (rct_se > 0)
+    return diff_estimate, diff_se, valid
+
+
+def outlier_mask(diff_estimate, measures, valid):
+    """Rows within OUTLIER_Z_SCORE SDs of their measure's mean difference"""
+    group_ids, groups = np.unique(measures, return_inverse=True)
+    n_groups = len(group_ids)
+    weights = valid.astype(float)
+    values = np.where(valid, diff_estimate, 0.0)
+
+    counts = np.bincount(groups, weights=weights, minlength=n_groups)
+    means = np.bincount(groups, weights=values, minlength=n_groups) / np.maximum(counts, 1)
+    squares = np.bincount(groups, weights=weights * (values - means[groups]) ** 2, minlength=n_groups)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        sds = np.sqrt(squares / (counts - 1))
+        z_scores = np.abs(diff_estimate - means[groups]) / sds[groups]
+
+    # Single-row measures have no SD and are kept, as in R
+    return ~(z_scores > OUTLIER_Z_SCORE)
+
+
+def forest_dataset():
+    """
+    Forest plot rows per effect measure, keyed by lower-case measure,
+    derived from the PICOComparison table.
+    """
+    columns = comparison_columns()
+    if columns is None:
+        return {}
+
+    diff_estimate, diff_se, valid = differences(columns)
+    keep = valid & outlier_mask(diff_estimate, columns['effect_measure'], valid)
+
+    lower_ci = diff_estimate - 1.96 * diff_se
+    upper_ci = diff_estimate + 1.96 * diff_se
+    sample_size = columns['n_trt'] + columns['n_ctrl']
+    has_sizes = np.isfinite(sample_size)
+
+    dataset = {}
+    for i in np.flatnonzero(keep):
+        measure = columns['effect_measure'][i]
+        dataset.setdefault(measure.lower(), []).append({
+            'study_id': columns['study_id'][i],
+            'author': columns['author'][i],
+            'year': columns['year'][i],
+            'study_label': f"{columns['author'][i]} {columns['year'][i]}",
+            'disease': columns['disease'][i],
+            'target_trial_name': columns['target_trial_name'][i],
+            'point_estimate': round(float(diff_estimate[i]), 4),
+            'lower_ci': round(float(lower_ci[i]), 4),
+            'upper_ci': round(float(upper_ci[i]), 4),
+            'sample_size': int(sample_size[i]) if has_sizes[i] else None,
+            'tte_estimate': float(columns['tte_estimate'][i]),
+            'rct_estimate': float(columns['rct_estimate'][i]),
+        })
+    return dataset
+
+
+def refresh_forest_data():
+    """Write the PICOComparison forest dataset to ttedb/data and return its row count"""
+    dataset = forest_dataset()
+    path = data_path(FOREST_DATA_FILENAME)
+    temporary_path = f'{path}.{os.getpid()}.tmp'
+    with open(temporary_path, 'w') as f:
+        json.dump(dataset, f, indent=2)
+    os.replace(temporary_path, path)
+    bump_generation()
+    return sum(len(rows) for rows in dataset.values())
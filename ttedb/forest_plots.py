@@ -0,0 +1,462 @@
+"""
+Forest plots for the analysis page.
+
+Forest plot data is built from the exports in ttedb/data/ and cached in
+the Django cache, keyed by effect measure and a content hash of the
+exports, so it is shared across requests and workers until the exports
+are regenerated.
+
+The analysis page draws the plots in the browser from the compact
+columnar payload of `get_forest_plot_columns()`; `get_forest_plots()`
+renders the same plots server-side with Plotly. Both read the study rows
+from the memory-mapped columnar store (see forest_store.py) rather than
+from the parsed JSON export.
+"""
+from collections import Counter
+
+from django.core.cache import cache
+
+from . import artifacts
+from .artifacts import load_artifact, newest_artifact
+from .forest_data import FOREST_DATA_FILENAME, forest_dataset
+from .forest_store import as_list, empty_columns, load_forest_store, rows_to_columns
+
+
+EFFECT_MEASURES = ['HR', 'OR', 'RR', 'RD', 'MD', 'SMD']
+
+EFFECT_MEASURE_NAMES = {
+    'HR': 'Hazard Ratio Data Points',
+    'OR': 'Odds Ratio Data Points',
+    'RR': 'Risk Ratio Data Points',
+    'RD': 'Risk Difference Data Points',
+    'MD': 'Mean Difference Data Points',
+    'SMD': 'Standardized Mean Difference Data Points'
+}
+
+# Forest plot rows: the R export and the dataset derived from PICOComparison
+FOREST_ROW_FILES = ['forest_plot_data.json', FOREST_DATA_FILENAME]
+
+# Exports the forest plots are built from
+FOREST_DATA_FILES = FOREST_ROW_FILES + ['meta_analysis_results.json']
+
+CACHE_KEY_PREFIX = 'forest_plot'
+FINGERPRINT_CACHE_KEY = f'{CACHE_KEY_PREFIX}:fingerprint'
+
+def data_fingerprint(filenames=FOREST_DATA_FILES):
+    """Content hash of analysis exports, by default the forest plot exports"""
+    return artifacts.data_fingerprint(filenames)
+
+
+def plot_cache_key(effect_measure, fingerprint):
+    """Cache key of one rendered forest plot"""
+    return f'{CACHE_KEY_PREFIX}:{effect_measure}:{fingerprint}'
+
+
+def columns_cache_key(effect_measure, fingerprint):
+    """Cache key of the columnar data of one forest plot"""
+    return f'{CACHE_KEY_PREFIX}:columns:{effect_measure}:{fingerprint}'
+
+
+def remember_fingerprint(fingerprint):
+    """Record the current fingerprint, evicting entries cached under the previous one"""
+    previous = cache.get(FINGERPRINT_CACHE_KEY)
+    if previous and previous != fingerprint:
+        cache.delete_many(
+            [plot_cache_key(measure, previous) for measure in EFFECT_MEASURES] +
+            [columns_cache_key(measure, previous) for measure in EFFECT_MEASURES]
+        )
+    cache.set(FINGERPRINT_CACHE_KEY, fingerprint, timeout=None)
+
+
+def forest_rows_filename():
+    """
+    The forest plot rows export in use: whichever is newer of the R export
+    and the dataset derived from PICOComparison at import time, or None
+    when neither exists.
+    """
+    return newest_artifact(FOREST_ROW_FILES)
+
+
+def load_forest_data():
+    """
+    Load forest plot rows and meta-analysis results.
+
+    Rows come from `forest_rows_filename()`, and are derived from the
+    database on the fly when neither rows export exists.
+    """
+    filename = forest_rows_filename()
+    real_forest_data = load_artifact(filename) if filename else forest_dataset()
+    
+    return real_forest_data, load_artifact('meta_analysis_results.json') or {}
+
+
+def load_forest_columns():
+    """
+    Columnar forest plot rows keyed by lower-case effect measure: the
+    memory-mapped store of `forest_rows_filename()`, or columns derived
+    from the database when neither rows export exists.
+    """
+    filename = forest_rows_filename()
+    if filename:
+        return load_forest_store(filename) or {}
+    
+    dataset = forest_dataset()
+    return {
+        measure: rows_to_columns(get_forest_plot_data(measure, dataset)) for measure in dataset
+    }
+
+
+def measure_columns(forest_columns, effect_measure):
+    """Columns of one effect measure, empty when it has no rows"""
+    return forest_columns.get(effect_measure.lower()) or empty_columns()
+
+
+def pooled_meta_results(columns_by_measure, method='DL'):
+    """
+    Frequentist pooled results for several effect measures, computed in
+    one batched call, in the schema of meta_analysis_results.json.
+
+    Standard errors are derived from the 95% CIs of the plotted rows.
+    """
+    import numpy as np
+    from .meta_analysis import METHODS, pool, standard_errors_from_ci, summaries
+
+    measures = [measure for measure, columns in columns_by_measure.items() if len(columns['point_estimate'])]
+    if not measures:
+        return {}
+
+    columns = [columns_by_measure[measure] for measure in measures]
+    groups = np.repeat(np.arange(len(measures)), [len(column['point_estimate']) for column in columns])
+    effects = np.concatenate([column['point_estimate'] for column in columns])
+    standard_errors = standard_errors_from_ci(
+        np.concatenate([column['lower_ci'] for column in columns]),
+        np.concatenate([column['upper_ci'] for column in columns]),
+    )
+    pooled = summaries(pool(effects, standard_errors, groups, method))
+
+    return {
+        measure: {
+            'effect_measure': measure,
+            **pooled[index],
+            'total_sample_size': int(np.nansum(columns[index]['sample_size'])),
+            'estimation': f"{METHODS[method]} pooling of the forest plot data",
+        }
+        for index, measure in enumerate(measures)
+    }
+
+
+def with_pooled_fallback(columns_by_measure, meta_data):
+    """Meta-analysis results, pooling the studies of any measure missing from meta_data"""
+    missing = {measure: columns for measure, columns in columns_by_measure.items() if measure not in meta_data}
+    return {**pooled_meta_results(missing), **meta_data}
+
+
+def build_forest_plots(forest_columns, meta_data, effect_measures=EFFECT_MEASURES):
+    """Render the forest plot div for each effect measure"""
+    columns_by_measure = {
+        measure: measure_columns(forest_columns, measure) for measure in effect_measures
+    }
+    meta_data = with_pooled_fallback(columns_by_measure, meta_data)
+
+    forest_plots = {}
+    for measure, columns in columns_by_measure.items():
+        title = f"{EFFECT_MEASURE_NAMES[measure]} (n={len(columns['point_estimate'])})"
+        forest_plots[measure] = generate_forest_plot(measure, columns, title, meta_data)
+    return forest_plots
+
+
+def get_forest_plots():
+    """
+    Rendered forest plots keyed by lower-case effect measure.
+    
+    Plots are served from the cache when available. When the exports
+    change, plots cached under the previous fingerprint are evicted and
+    the plots are rebuilt once.
+    """
+    fingerprint = data_fingerprint()
+    keys = {measure: plot_cache_key(measure, fingerprint) for measure in EFFECT_MEASURES}
+    cached = cache.get_many(list(keys.values()))
+    
+    missing = [measure for measure, key in keys.items() if key not in cached]
+    if missing:
+        remember_fingerprint(fingerprint)
+        meta_data = load_artifact('meta_analysis_results.json') or {}
+        built = build_forest_plots(load_forest_columns(), meta_data, missing)
+        cache.set_many({keys[measure]: html for measure, html in built.items()}, timeout=None)
+        cached.update({keys[measure]: html for measure, html in built.items()})
+    
+    return {measure.lower(): cached[key] for measure, key in keys.items()}
+
+
+def forest_plot_columns(effect_measure, columns, meta_data):
+    """
+    Compact columnar forest plot data for one effect measure.
+
+    Study rows become parallel arrays and the pooled summary is taken
+    from the meta-analysis results (pooled from the rows when the measure
+    is missing there), so the browser can draw the plot without any
+    per-row objects.
+    """
+    n_studies = len(columns['point_estimate'])
+    real_meta = with_pooled_fallback({effect_measure: columns}, meta_data).get(effect_measure)
+
+    pooled = None
+    if real_meta:
+        pooled = {
+            'estimate': real_meta['pooled_estimate'],
+            'lower': real_meta['ci_lower'],
+            'upper': real_meta['ci_upper'],
+            'prediction_lower': real_meta.get('prediction_lower', real_meta['ci_lower']),
+            'prediction_upper': real_meta.get('prediction_upper', real_meta['ci_upper']),
+            'i_squared': real_meta.get('i_squared', 0),
+            'tau_squared': real_meta.get('tau_squared', 0),
+            'q_statistic': real_meta.get('q_statistic', 0),
+            'q_pvalue': real_meta.get('q_pvalue', 1.0),
+            'n_studies': real_meta.get('n_studies', n_studies),
+            'total_sample_size': real_meta.get('total_sample_size', 0),
+        }
+
+    return {
+        'effect_measure': effect_measure,
+        'title': f"{EFFECT_MEASURE_NAMES[effect_measure]} (n={n_studies})",
+        'axis_title': (
+            f"{effect_measure} Difference (Log Scale)" if effect_measure in ['HR', 'OR', 'RR']
+            else f"{effect_measure} Difference"
+        ),
+        'labels': as_list(columns['study_label']),
+        'authors': as_list(columns['author']),
+        'years': as_list(columns['year'], integer=True),
+        'estimates': as_list(columns['point_estimate']),
+        'lower': as_list(columns['lower_ci']),
+        'upper': as_list(columns['upper_ci']),
+        'tte_estimates': as_list(columns['tte_estimate']),
+        'rct_estimates': as_list(columns['rct_estimate']),
+        'sample_sizes': as_list(columns['sample_size'], integer=True),
+        'pooled': pooled,
+    }
+
+
+def get_forest_plot_columns(effect_measure):
+    """
+    Columnar forest plot data for one effect measure, served from the
+    cache until the exports change.
+    """
+    fingerprint = data_fingerprint()
+    key = columns_cache_key(effect_measure, fingerprint)
+    columns = cache.get(key)
+    if columns is None:
+        remember_fingerprint(fingerprint)
+        meta_data = load_artifact('meta_analysis_results.json') or {}
+        columns = forest_plot_columns(
+            effect_measure, measure_columns(load_forest_columns(), effect_measure), meta_data
+        )
+        cache.set(key, columns, timeout=None)
+    return columns
+
+
+def forest_hover_texts(columns):
+    """Hover text for every study, built with vectorized string operations"""
+    import numpy as np
+
+    def formatted(values, fmt, missing):
+        return np.where(np.isnan(values), missing, np.char.mod(fmt, np.nan_to_num(values)))
+
+    sample_sizes = np.where(columns['sample_size'] > 0, columns['sample_size'], np.nan)
+    parts = [
+        '<b>', columns['author'], ' et al. ', formatted(columns['year'], '%d', ''), '</b><br>',
+        'Point Estimate: ', np.char.mod('%.3f', columns['point_estimate']), '<br>',
+        '95% CI: [', np.char.mod('%.3f', columns['lower_ci']), ', ',
+        np.char.mod('%.3f', columns['upper_ci']), ']<br>',
+        'TTE Estimate: ', formatted(columns['tte_estimate'], '%g', 'N/A'), '<br>',
+        'RCT Estimate: ', formatted(columns['rct_estimate'], '%g', 'N/A'), '<br>',
+        'Sample Size: ', formatted(sample_sizes, '%d', 'Not reported'),
+    ]
+    hover = np.full(len(columns['point_estimate']), '', dtype=object)
+    for part in parts:
+        hover = hover + part
+    return hover
+
+
+def generate_forest_plot(effect_measure, columns, title, meta_results=None):
+    """Generate interactive forest plot using Plotly from the columns of one measure"""
+    import numpy as np
+    import plotly.graph_objects as go
+    import plotly.offline as ply
+    
+    n_studies = len(columns['point_estimate'])
+    if not n_studies:
+        return "<div class='alert alert-info'>No data available for this measure type</div>"
+
+    fig = go.Figure()
+
+    study_labels = columns['study_label'].tolist()
+    point_estimates = columns['point_estimate']
+    lower_cis = columns['lower_ci']
+    upper_cis = columns['upper_ci']
+
+    # All studies as a single trace: markers with asymmetric CI error bars
+    fig.add_trace(go.Scatter(
+        x=point_estimates,
+        y=np.arange(len(point_estimates)),
+        mode='markers',
+        error_x=dict(
+            type='data',
+            symmetric=False,
+            array=upper_cis - point_estimates,
+            arrayminus=point_estimates - lower_cis,
+            color='#2E86AB',
+            thickness=3,
+            width=0
+        ),
+        marker=dict(
+            color='#2E86AB',
+            size=12,
+            symbol='square',
+            line=dict(color='white', width=2)
+        ),
+        text=forest_hover_texts(columns),
+        hoverinfo='text',
+        showlegend=False,
+        name='Studies'
+    ))
+
+    # Use real meta-analysis results if available, otherwise pool the plotted studies
+    real_meta = (meta_results or {}).get(effect_measure.upper())
+    if not real_meta:
+        real_meta = pooled_meta_results({effect_measure.upper(): columns})[effect_measure.upper()]
+    pooled_pe = real_meta['pooled_estimate']
+    pooled_lower = real_meta['ci_lower']
+    pooled_upper = real_meta['ci_upper']
+    pred_lower = real_meta.get('prediction_lower', pooled_lower)
+    pred_upper = real_meta.get('prediction_upper', pooled_upper)
+    i_squared = real_meta.get('i_squared', 0)
+    tau_squared = real_meta.get('tau_squared', 0)
+    q_stat = real_meta.get('q_statistic', 0)
+    q_pvalue = real_meta.get('q_pvalue', 1.0)
+    total_n = real_meta.get('total_sample_size', 0)
+    n_studies = real_meta.get('n_studies', len(point_estimates))
+    df = n_studies - 1
+
+    # Add pooled estimate
+    pooled_y = len(point_estimates) + 0.5
+
+    # Create comprehensive tooltip for pooled estimate
+    pooled_tooltip = f"""<b>Random-Effects Meta-Analysis</b><br>
+<b>Pooled Estimate:</b> {pooled_pe:.3f}<br>
+<b>95% CI:</b> [{pooled_lower:.3f}, {pooled_upper:.3f}]<br>
+<b>95% Prediction Interval:</b> [{pred_lower:.3f}, {pred_upper:.3f}]<br>
+<br><b>Heterogeneity Metrics:</b><br>
+<b>I² =</b> {i_squared:.1f}%<br>
+<b>τ² =</b> {tau_squared:.4f}<br>
+<b>Q =</b> {q_stat:.2f}, df = {df}, p = {q_pvalue:.3f}<br>
+<br><b>Study Information:</b><br>
+<b>Studies:</b> {n_studies}<br>
+<b>Total Sample Size:</b> {total_n:,}"""
+
+    # Pooled point estimate (diamond) with its CI as error bars
+    fig.add_trace(go.Scatter(
+        x=[pooled_pe],
+        y=[pooled_y],
+        mode='markers',
+        error_x=dict(
+            type='data',
+            symmetric=False,
+            array=[pooled_upper - pooled_pe],
+            arrayminus=[pooled_pe - pooled_lower],
+            color='#F18F01',
+            thickness=5,
+            width=0
+        ),
+        marker=dict(
+            color='#F18F01',
+            size=16,
+            symbol='diamond',
+            line=dict(color='white', width=2)
+        ),
+        text=pooled_tooltip,
+        hoverinfo='text',
+        showlegend=False,
+        name='Pooled'
+    ))
+
+    # Add vertical line at null effect
+    # For ratio measures on log scale: null effect is at 0 (since log(1) = 0)
+    # For difference measures on linear scale: null effect is at 0
+    null_effect = 0.0  # Null effect is always 0 (log(1)=0 for ratios, 0 for differences)
+    fig.add_vline(x=null_effect, line_dash="dash", line_color="red", line_width=2,
+                 annotation_text="No Effect", annotation_position="top")
+
+    # Update layout
+    y_labels = study_labels + ['', 'Pooled Estimate']
+
+    fig.update_layout(
+        title=dict(
+            text=title,
+            font=dict(size=16, color='#333'),
+            x=0.5
+        ),
+        xaxis=dict(
+            title=f"{effect_measure} Difference (Log Scale)" if effect_measure in ['HR', 'OR', 'RR'] else f"{effect_measure} Difference",
+            showgrid=True,
+            gridcolor='lightgray',
+            type='linear'  # Data is already log-transformed differences, so use linear scale
+        ),
+        yaxis=dict(
+            tickmode='array',
+            tickvals=list(range(len(y_labels))),
+            ticktext=y_labels,
+            autorange='reversed',
+            showgrid=False
+        ),
+        width=1200,
+        height=max(400, len(point_estimates) * 25 + 150),
+        margin=dict(l=180, r=20, t=80, b=50),
+        plot_bgcolor='white',
+        paper_bgcolor='white',
+        hovermode='closest'
+    )
+
+    # Convert to HTML
+    return ply.plot(fig, output_type='div', include_plotlyjs=False)
+
+def get_forest_plot_data(effect_measure, real_forest_data=None):
+    """Forest plot rows of one effect measure, labelled and sorted for display"""
+    real_data = (real_forest_data or {}).get(effect_measure.lower(), [])
+    studies = []
+    label_counts = Counter()
+
+    for i, row in enumerate(real_data):
+        # Create unique label for each data point
+        author = row.get('author', f'Study {i+1}')
+        year = row.get('year', 2020)
+
+        # Add suffix for multiple comparisons from same study
+        label_counts[(author, year)] += 1
+        study_count = label_counts[(author, year)]
+
+        if study_count > 1:
+            data_point_label = f"{author} {year} ({study_count})"
+        else:
+            data_point_label = f"{author} {year}"
+
+        sample_size = row.get('sample_size')
+        studies.append({
+            'author': author,
+            'year': year,
+            'study_label': data_point_label,
+            'point_estimate': row['point_estimate'],
+            'lower_ci': row['lower_ci'],
+            'upper_ci': row['upper_ci'],
+            'population': f"N = {sample_size:,}" if sample_size else 'N = Not reported',
+            'sample_size': sample_size,
+            'tte_estimate': row.get('tte_estimate'),
+            'rct_estimate': row.get('rct_estimate'),
+            'study_id': row.get('study_id', f'datapoint_{i+1}'),
+            'target_trial': row.get('target_trial_name') or '',
+            'disease': row.get('disease') or '',
+            'comparison_id': i + 1
+        })
+
+    # Sort by year, then author, then comparison
+    studies.sort(key=lambda x: (x['year'], x['author'], x.get('comparison_id', 0)))
+    return studies
@@ -0,0 +1,149 @@
+"""
+Filtering, ordering and paging of the forest plot rows.
+
+Queries run as NumPy masks over the columnar store (see forest_store.py),
+so a request only turns the rows of the page it returns into Python
+objects. Categorical columns (disease, target trial) are indexed once
+per store as integer codes of their lower-cased values, and filtering
+on them compares codes instead of strings.
+"""
+import numpy as np
+
+from .forest_store import as_list
+
+
+QUERY_PARAMS = ['min_year', 'max_year', 'author', 'disease', 'target_trial', 'ordering', 'limit', 'offset']
+
+# ?ordering= name -> store column; precision is the inverse standard error
+ORDERING_FIELDS = {
+    'year': 'year',
+    'author': 'author',
+    'estimate': 'point_estimate',
+    'sample_size': 'sample_size',
+    'precision': None,
+}
+
+CATEGORICAL_COLUMNS = ['disease', 'target_trial']
+
+# Fields of the returned rows, in the schema of forest_plot_data.json
+ROW_FIELDS = [
+    'study_id', 'author', 'year', 'study_label', 'point_estimate', 'lower_ci', 'upper_ci',
+    'sample_size', 'tte_estimate', 'rct_estimate', 'disease', 'target_trial',
+]
+INTEGER_FIELDS = ['year', 'sample_size']
+
+# memory-mapped column file -> (sorted lower-case values, code of every row)
+_category_memo = {}
+
+
+def is_query(params):
+    """
+    Whether a request asks for filtered, ordered or paged rows; several
+    comma-separated ?effect_measure= values are a query on their own
+    """
+    return any(param in params for param in QUERY_PARAMS) or ',' in params.get('effect_measure', '')
+
+
+def category_codes(values):
+    """Sorted distinct lower-case values of a string column and the code of every row"""
+    key = getattr(values, 'filename', None)
+    if key is not None and key in _category_memo:
+        return _category_memo[key]
+    codes = np.unique(np.char.lower(np.asarray(values)), return_inverse=True)
+    if key is not None:
+        _category_memo[key] = codes
+    return codes
+
+
+def parse_filters(params):
+    """Row filters of a query; raises ValueError for malformed values"""
+    filters = {}
+    for param in ['min_year', 'max_year']:
+        if params.get(param):
+            try:
+                filters[param] = int(params[param])
+            except ValueError:
+                raise ValueError(f'{param} must be a year, got {params[param]!r}')
+    for param in ['author', 'disease', 'target_trial']:
+        if params.get(param):
+            filters[param] = params[param].strip().lower()
+    return filters
+
+
+def parse_ordering(value):
+    """(field, descending) pairs of an ?ordering= value such as '-precision,year'"""
+    ordering = []
+    for item in filter(None, (value or '').split(',')):
+        field = item.strip().lstrip('-')
+        if field not in ORDERING_FIELDS:
+            raise ValueError(f'Cannot order by {field!r}. Use one of {", ".join(ORDERING_FIELDS)}')
+        ordering.append((field, item.strip().startswith('-')))
+    return ordering
+
+
+def row_mask(columns, filters):
+    """Boolean mask of the rows of one measure that match every filter"""
+    mask = np.ones(len(columns['point_estimate']), dtype=bool)
+    if 'min_year' in filters:
+        mask &= columns['year'] >= filters['min_year']
+    if 'max_year' in filters:
+        mask &= columns['year'] <= filters['max_year']
+    for column in CATEGORICAL_COLUMNS:
+        if column in filters:
+            values, codes = category_codes(columns[column])
+            matches = np.flatnonzero(values == filters[column])
+            mask &= np.isin(codes, matches)
+    if 'author' in filters:
+        authors = np.char.lower(np.asarray(columns['author'])[mask])
+        mask[mask] = np.char.find(authors, filters['author']) >= 0
+    return mask
+
+
+def sort_key(columns, field, rows):
+    if field == 'precision':
+        return 1.0 / (np.asarray(columns['upper_ci'])[rows] - np.asarray(columns['lower_ci'])[rows])
+    return np.asarray(columns[ORDERING_FIELDS[field]])[rows]
+
+
+def select_rows(forest_columns, measures, filters, ordering):
+    """
+    Matching rows of the given measures as parallel (measure, row) index
+    arrays, in the requested order; rows of one measure keep their
+    display order unless ordered otherwise.
+    """
+    parts = [
+        (measure, np.flatnonzero(row_mask(forest_columns[measure.lower()], filters)))
+        for measure in measures if measure.lower() in forest_columns
+    ]
+    if not parts:
+        return np.array([], dtype=object), np.array([], dtype=int)
+
+    measure_ids = np.concatenate([np.full(len(rows), measure, dtype=object) for measure, rows in parts])
+    row_ids = np.concatenate([rows for _, rows in parts])
+    if ordering:
+        keys = []
+        for field, descending in ordering:
+            key = np.concatenate([sort_key(forest_columns[measure.lower()], field, rows) for measure, rows in parts])
+            if descending:
+                # Strings cannot be negated; rank them first
+                key = -np.unique(key, return_inverse=True)[1] if key.dtype.kind == 'U' else -key
+            keys.append(key)
+        # np.lexsort sorts by the last key first; it is stable, so ties keep the display order
+        order = np.lexsort(keys[::-1])
+        measure_ids, row_ids = measure_ids[order], row_ids[order]
+    return measure_ids, row_ids
+
+
+def row_dicts(forest_columns, measure_ids, row_ids):
+    """Row objects of the selected rows, for one page of results"""
+    rows = []
+    for measure in dict.fromkeys(measure_ids):
+        positions = np.flatnonzero(measure_ids == measure)
+        columns = forest_columns[measure.lower()]
+        values = {
+            field: as_list(np.asarray(columns[field])[row_ids[positions]], integer=field in INTEGER_FIELDS)
+            for field in ROW_FIELDS
+        }
+        for i, position in enumerate(positions):
+            rows.append((position, {'effect_measure': measure, **{field: values[field][i] for field in ROW_FIELDS}}))
+    return [row for _, row in sorted(rows, key=lambda item: item[0])]
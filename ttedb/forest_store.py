@@ -0,0 +1,157 @@
+"""
+Memory-mapped columnar store of the forest plot rows.
+
+Each rows export (the R forest_plot_data.json and the dataset derived
+from PICOComparison) is converted once into one `.npy` file per effect
+measure and column under ttedb/data/columnar/, in the labelled and
+sorted order of `forest_plots.get_forest_plot_data()`. Readers map the
+files read-only, so every gunicorn worker shares the same page-cache
+pages instead of holding its own parsed copy of the rows as Python
+dicts. Directory names carry the export's content fingerprint, so a
+regenerated export is converted again on first use; the stores of
+previous versions are removed when the exports are published or
+refreshed.
+"""
+import os
+import shutil
+
+import numpy as np
+
+from .artifacts import data_fingerprint, data_path, load_artifact
+from .forest_data import FOREST_DATA_FILENAME
+
+
+STORE_DIRNAME = 'columnar'
+
+# Bumped when the columns change, so that stores in the old layout are rebuilt
+STORE_FORMAT = 3
+
+# Rows exports with a columnar store
+STORED_ARTIFACTS = ['forest_plot_data.json', FOREST_DATA_FILENAME]
+
+STRING_COLUMNS = ['study_label', 'author', 'study_id', 'disease', 'target_trial']
+
+# Stored as float64, with NaN for missing values
+NUMBER_COLUMNS = ['year', 'point_estimate', 'lower_ci', 'upper_ci', 'sample_size', 'tte_estimate', 'rct_estimate']
+
+# filename -> (store directory, {measure: {column: memory-mapped array}})
+_store_memo = {}
+
+
+def store_root():
+    return data_path(STORE_DIRNAME)
+
+
+def store_stem(filename):
+    return filename[:-len('.json')] if filename.endswith('.json') else filename
+
+
+def store_dir(filename, fingerprint):
+    return os.path.join(store_root(), f'{store_stem(filename)}.{fingerprint}-v{STORE_FORMAT}')
+
+
+def rows_to_columns(studies):
+    """Forest plot rows as NumPy columns, in the layout of the store"""
+    columns = {
+        column: np.array([str(study.get(column) or '') for study in studies], dtype=str)
+        for column in STRING_COLUMNS
+    }
+    for column in NUMBER_COLUMNS:
+        columns[column] = np.array(
+            [np.nan if study.get(column) is None else study[column] for study in studies], dtype=float
+        )
+    return columns
+
+
+def empty_columns():
+    return rows_to_columns([])
+
+
+def as_list(values, integer=False):
+    """JSON-ready list of a column, with None for missing numbers"""
+    if values.dtype.kind != 'f':
+        return values.tolist()
+    convert = int if integer else float
+    return [None if value != value else convert(value) for value in values.tolist()]
+
+
+def build_forest_store(filename):
+    """
+    Convert a rows export into its columnar store. Returns the store
+    directory, or None when the export is missing or invalid.
+
+    Stores of other versions are left alone: this also runs on first use
+    in workers whose fingerprint may be stale, and another worker may be
+    mapping a newer store. `build_forest_stores()` removes them.
+    """
+    from .forest_plots import get_forest_plot_data
+
+    data = load_artifact(filename)
+    if data is None:
+        return None
+
+    directory = store_dir(filename, data_fingerprint([filename]))
+    if not os.path.isdir(directory):
+        temporary_dir = os.path.join(store_root(), f'.{os.path.basename(directory)}.{os.getpid()}.tmp')
+        for measure, rows in data.items():
+            if not rows:
+                # Empty arrays cannot be memory-mapped; readers treat absent measures as empty
+                continue
+            columns = rows_to_columns(get_forest_plot_data(measure, data))
+            os.makedirs(os.path.join(temporary_dir, measure.lower()), exist_ok=True)
+            for column, values in columns.items():
+                np.save(os.path.join(temporary_dir, measure.lower(), f'{column}.npy'), values)
+        os.makedirs(temporary_dir, exist_ok=True)
+        try:
+            os.replace(temporary_dir, directory)
+        except OSError:
+            # Another process published the same store first
+            shutil.rmtree(temporary_dir, ignore_errors=True)
+    return directory
+
+
+def remove_stale_stores(filename, directory):
+    """Remove the stores of a rows export other than `directory`"""
+    for name in os.listdir(store_root()):
+        if name.startswith(f'{store_stem(filename)}.') and name != os.path.basename(directory):
+            shutil.rmtree(os.path.join(store_root(), name), ignore_errors=True)
+
+
+def build_forest_stores():
+    """
+    Build the store of every rows export and drop the stores of earlier
+    versions. Run by the commands that publish or refresh the exports,
+    after the dataset generation is bumped. Returns how many were built.
+    """
+    built = 0
+    for filename in STORED_ARTIFACTS:
+        directory = build_forest_store(filename)
+        if directory is not None:
+            remove_stale_stores(filename, directory)
+            built += 1
+    return built
+
+
+def load_forest_store(filename):
+    """
+    Memory-mapped columns of a rows export keyed by lower-case measure,
+    building the store on first use. None when the export is missing or
+    invalid.
+    """
+    directory = store_dir(filename, data_fingerprint([filename]))
+    memo = _store_memo.get(filename)
+    if memo is not None and memo[0] == directory:
+        return memo[1]
+
+    if not os.path.isdir(directory) and build_forest_store(filename) is None:
+        return None
+
+    store = {
+        measure: {
+            column: np.load(os.path.join(directory, measure, f'{column}.npy'), mmap_mode='r')
+            for column in STRING_COLUMNS + NUMBER_COLUMNS
+        }
+        for measure in sorted(os.listdir(directory))
+    }
+    _store_memo[filename] = (directory, store)
+    return store
@@ -0,0 +1,205 @@
+"""
+Leave-one-out and influence diagnostics of the random-effects pooling.
+
+For every comparison of an effect measure, `influence()` returns what
+dropping it does to the DerSimonian-Laird pooling: the leave-one-out
+pooled estimate, its standard error, tau², Q and I², together with the
+externally standardized residual, DFFITS, Cook's distance, DFBETAS, the
+covariance ratio and the hat value, as in metafor's `influence()`.
+
+No model is refitted. DL tau² only depends on the sums of w, w*y, w*y²
+and w², so the leave-one-out values of every comparison come from
+downdating those sums by its own terms. The leave-one-out pooled
+estimates reweight every other comparison with its own tau², which is
+one (rows x comparisons) array pass, done in blocks of rows to bound
+memory.
+
+Results are arrays aligned with the rows of the forest plot store and
+are memoized per measure for the forest rows fingerprint, so they are
+computed once per dataset version.
+"""
+import numpy as np
+
+
+# Median of the chi-square distribution with 1 df, metafor's Cook's distance cut-off
+COOK_THRESHOLD = 0.454936423119572
+
+# Leave-one-out rows reweighted per block
+INFLUENCE_BLOCK_ROWS = 1024
+
+INFLUENCE_FIELDS = [
+    'loo_estimate', 'loo_se', 'loo_tau_squared', 'loo_q_statistic', 'loo_i_squared',
+    'rstudent', 'dffits', 'cook_distance', 'dfbetas', 'cov_ratio', 'hat', 'weight', 'influential',
+]
+
+# (forest rows fingerprint, {measure: influence result})
+_influence_memo = [None, {}]
+
+
+def _dl_tau_squared(q_statistic, df, weights_sum, weights_sq_sum):
+    with np.errstate(divide='ignore', invalid='ignore'):
+        c = weights_sum - weights_sq_sum / weights_sum
+        tau_squared = np.where(c > 0, (q_statistic - df) / c, 0.0)
+    return np.maximum(tau_squared, 0.0)
+
+
+def _i_squared(q_statistic, df):
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(q_statistic > 0, np.maximum(0.0, (q_statistic - df) / q_statistic) * 100, 0.0)
+
+
+def influence(effects, standard_errors, block_rows=INFLUENCE_BLOCK_ROWS):
+    """
+    Leave-one-out and influence diagnostics of DL random-effects pooling.
+
+    Returns a dict with the full-data n_studies, pooled_estimate,
+    pooled_se, tau_squared, q_statistic and i_squared, and one array per
+    comparison for each of INFLUENCE_FIELDS.
+    """
+    effects = np.asarray(effects, dtype=float)
+    variances = np.asarray(standard_errors, dtype=float) ** 2
+    k = len(effects)
+    if k < 2:
+        nan = np.full(k, np.nan)
+        return {
+            'n_studies': k, 'pooled_estimate': float(effects[0]) if k else None, 'pooled_se': None,
+            'tau_squared': 0.0, 'q_statistic': 0.0, 'i_squared': 0.0,
+            **{field: nan.copy() for field in INFLUENCE_FIELDS[:-1]}, 'influential': np.zeros(k, dtype=bool),
+        }
+
+    # Q is shift invariant; centering on the fixed-effect mean keeps the downdated sums accurate
+    weights = 1.0 / variances
+    centered = effects - np.sum(weights * effects) / np.sum(weights)
+    sums = np.array([
+        np.sum(weights), np.sum(weights * centered), np.sum(weights * centered ** 2), np.sum(weights ** 2)
+    ])
+    weights_sum, weighted_sum, weighted_squares, weights_sq_sum = sums
+
+    # Full-data DL fit
+    q_statistic = weighted_squares - weighted_sum ** 2 / weights_sum
+    tau_squared = float(_dl_tau_squared(q_statistic, k - 1, weights_sum, weights_sq_sum))
+    random_weights = 1.0 / (variances + tau_squared)
+    random_weights_sum = random_weights.sum()
+    pooled_estimate = np.sum(random_weights * effects) / random_weights_sum
+    pooled_variance = 1.0 / random_weights_sum
+
+    # Leave-one-out DL fits by downdating the sums
+    loo_weights_sum = weights_sum - weights
+    loo_weighted_sum = weighted_sum - weights * centered
+    loo_q_statistic = np.maximum(
+        weighted_squares - weights * centered ** 2 - loo_weighted_sum ** 2 / loo_weights_sum, 0.0
+    )
+    loo_tau_squared = _dl_tau_squared(loo_q_statistic, k - 2, loo_weights_sum, weights_sq_sum - weights ** 2)
+
+    # Leave-one-out pooled estimates, reweighting the other rows with each tau²
+    loo_random_weights_sum = np.empty(k)
+    loo_estimate = np.empty(k)
+    for start in range(0, k, block_rows):
+        rows = np.arange(start, min(start + block_rows, k))
+        block = 1.0 / (variances[np.newaxis, :] + loo_tau_squared[rows, np.newaxis])
+        block[np.arange(len(rows)), rows] = 0.0
+        loo_random_weights_sum[rows] = block.sum(axis=1)
+        loo_estimate[rows] = block @ effects / loo_random_weights_sum[rows]
+    loo_variance = 1.0 / loo_random_weights_sum
+
+    hat = random_weights / random_weights_sum
+    shift = pooled_estimate - loo_estimate
+    with np.errstate(divide='ignore', invalid='ignore'):
+        rstudent = (effects - loo_estimate) / np.sqrt(variances + loo_tau_squared + loo_variance)
+        dffits = shift / np.sqrt(hat * (loo_tau_squared + variances))
+    cook_distance = shift ** 2 / pooled_variance
+    dfbetas = shift / np.sqrt(loo_variance)
+    cov_ratio = loo_variance / pooled_variance
+
+    # metafor's criteria for an influential study
+    influential = (
+        (np.abs(dffits) > 3 * np.sqrt(1 / (k - 1)))
+        | (cook_distance > COOK_THRESHOLD)
+        | (hat > 3 / k)
+        | (np.abs(dfbetas) > 1)
+    )
+
+    return {
+        'n_studies': k,
+        'pooled_estimate': float(pooled_estimate),
+        'pooled_se': float(np.sqrt(pooled_variance)),
+        'tau_squared': tau_squared,
+        'q_statistic': float(q_statistic),
+        'i_squared': float(_i_squared(q_statistic, k - 1)),
+        'loo_estimate': loo_estimate,
+        'loo_se': np.sqrt(loo_variance),
+        'loo_tau_squared': loo_tau_squared,
+        'loo_q_statistic': loo_q_statistic,
+        'loo_i_squared': _i_squared(loo_q_statistic, k - 2),
+        'rstudent': rstudent,
+        'dffits': dffits,
+        'cook_distance': cook_distance,
+        'dfbetas': dfbetas,
+        'cov_ratio': cov_ratio,
+        'hat': hat,
+        'weight': hat * 100,
+        'influential': influential,
+    }
+
+
+def measure_influence(effect_measure):
+    """
+    Influence diagnostics of the forest plot rows of one effect measure,
+    computed once per version of the rows export
+    """
+    from .forest_plots import FOREST_ROW_FILES, data_fingerprint, load_forest_columns, measure_columns
+    from .meta_analysis import standard_errors_from_ci
+
+    fingerprint = data_fingerprint(FOREST_ROW_FILES)
+    if _influence_memo[0] != fingerprint:
+        _influence_memo[:] = [fingerprint, {}]
+    results = _influence_memo[1]
+    if effect_measure not in results:
+        columns = measure_columns(load_forest_columns(), effect_measure)
+        results[effect_measure] = influence(
+            columns['point_estimate'], standard_errors_from_ci(columns['lower_ci'], columns['upper_ci'])
+        )
+    return results[effect_measure]
+
+
+def influence_columns(effect_measure):
+    """
+    JSON-ready influence diagnostics of one effect measure: the full-data
+    fit and one list per diagnostic, aligned with the study labels
+    """
+    from .forest_plots import load_forest_columns, measure_columns
+    from .forest_store import as_list
+
+    result = measure_influence(effect_measure)
+    columns = measure_columns(load_forest_columns(), effect_measure)
+    return {
+        'effect_measure': effect_measure,
+        **{field: result[field] for field in ['n_studies', 'pooled_estimate', 'pooled_se', 'tau_squared', 'q_statistic', 'i_squared']},
+        'method': 'Random-effects (DerSimonian-Laird), leave-one-out',
+        'study_label': as_list(np.asarray(columns['study_label'])),
+        'study_id': as_list(np.asarray(columns['study_id'])),
+        **{field: as_list(np.asarray(result[field])) for field in INFLUENCE_FIELDS},
+    }
+
+
+def influential_comparisons(effect_measure, limit=10):
+    """The comparisons of one measure flagged as influential, most influential (Cook's distance) first"""
+    from .forest_plots import load_forest_columns, measure_columns
+
+    result = measure_influence(effect_measure)
+    columns = measure_columns(load_forest_columns(), effect_measure)
+    flagged = np.flatnonzero(result['influential'])
+    flagged = flagged[np.argsort(-result['cook_distance'][flagged], kind='stable')][:limit]
+    return [
+        {
+            'study_label': str(columns['study_label'][i]),
+            'point_estimate': float(columns['point_estimate'][i]),
+            'loo_estimate': float(result['loo_estimate'][i]),
+            'shift': float(result['pooled_estimate'] - result['loo_estimate'][i]),
+            'loo_tau_squared': float(result['loo_tau_squared'][i]),
+            'rstudent': float(result['rstudent'][i]),
+            'cook_distance': float(result['cook_distance'][i]),
+            'dffits': float(result['dffits'][i]),
+        }
+        for i in flagged
+    ]
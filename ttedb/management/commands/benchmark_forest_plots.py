@@ -0,0 +1,67 @@
+import time
+
+import numpy as np
+from django.core.management.base import BaseCommand
+from ttedb.forest_plots import generate_forest_plot
+from ttedb.forest_store import rows_to_columns
+
+
+class Command(BaseCommand):
+    help = 'Benchmark forest plot build time and HTML payload size on synthetic data'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sizes',
+            type=int,
+            nargs='+',
+            default=[100, 1000, 10000],
+            help='Numbers of rows to benchmark'
+        )
+        parser.add_argument(
+            '--repeat',
+            type=int,
+            default=3,
+            help='Builds per size; the fastest is reported'
+        )
+
+    def handle(self, *args, **options):
+        meta_results = {
+            'HR': {
+                'pooled_estimate': 0.03, 'ci_lower': -0.01, 'ci_upper': 0.06,
+                'tau_squared': 0.015,
+            }
+        }
+
+        # Warm up imports so the first size is not charged for them
+        generate_forest_plot('HR', self.synthetic_rows(10), 'Warm-up', meta_results)
+
+        self.stdout.write(f'{"Rows":>8}  {"Build (ms)":>12}  {"Payload (KiB)":>14}')
+        for size in options['sizes']:
+            columns = self.synthetic_rows(size)
+            timings = []
+            for _ in range(options['repeat']):
+                start = time.perf_counter()
+                html = generate_forest_plot('HR', columns, f'Benchmark (n={size})', meta_results)
+                timings.append(time.perf_counter() - start)
+            self.stdout.write(f'{size:>8}  {min(timings) * 1000:>12.1f}  {len(html) / 1024:>14.1f}')
+
+    def synthetic_rows(self, size):
+        """Reproducible log-scale differences shaped like forest_plot_data.json, as columns"""
+        rng = np.random.default_rng(42)
+        point_estimates = rng.normal(0, 0.2, size)
+        standard_errors = rng.uniform(0.05, 0.3, size)
+        years = rng.integers(2018, 2025, size)
+        return rows_to_columns([
+            {
+                'author': f'Author{i}',
+                'year': int(years[i]),
+                'study_label': f'Author{i} {years[i]}',
+                'point_estimate': float(point_estimates[i]),
+                'lower_ci': float(point_estimates[i] - 1.96 * standard_errors[i]),
+                'upper_ci': float(point_estimates[i] + 1.96 * standard_errors[i]),
+                'sample_size': 1000,
+                'tte_estimate': 1.0,
+                'rct_estimate': 1.0,
+            }
+            for i in range(size)
+        ])
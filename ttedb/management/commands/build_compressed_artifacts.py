@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+from ttedb.precompressed import brotli, build_compressed_artifacts
+
+
+class Command(BaseCommand):
+    help = 'Write gzip/brotli variants and per-measure slices of the analysis exports in ttedb/data'
+
+    def handle(self, *args, **options):
+        if brotli is None:
+            self.stdout.write(self.style.WARNING('brotli is not installed; writing gzip variants only'))
+        self.stdout.write('Building pre-compressed analysis artifacts...')
+        count = build_compressed_artifacts()
+        self.stdout.write(
+            self.style.SUCCESS(f'Successfully wrote {count} artifact variants')
+        )
@@ -3,6 +3,11 @@ import numpy as np
 from django.core.management.base import BaseCommand, CommandError
 from django.db import transaction
 from ttedb.models import TTEStudy, PICOComparison
+from ttedb.statistics import refresh_statistics
+from ttedb.forest_data import refresh_forest_data
+from ttedb.subgroups import refresh_subgroup_results
+from ttedb.precompressed import build_compressed_artifacts
+from ttedb.forest_store import build_forest_stores
 import os
 from pathlib import Path
 
@@ -28,6 +33,21 @@ class Command(BaseCommand):
             action='store_true',
             help='Clear existing data before importing'
         )
+        parser.add_argument(
+            '--skip-statistics',
+            action='store_true',
+            help='Do not refresh the precomputed database statistics after importing'
+        )
+        parser.add_argument(
+            '--skip-forest-data',
+            action='store_true',
+            help='Do not rebuild the forest plot dataset after importing'
+        )
+        parser.add_argument(
+            '--skip-subgroup-results',
+            action='store_true',
+            help='Do not recompute the subgroup analysis results after importing'
+        )
 
     def handle(self, *args, **options):
         studies_csv_path = options['studies_csv']
@@ -60,6 +80,31 @@ class Command(BaseCommand):
                 f'Successfully imported {studies_count} studies and {picos_count} PICO comparisons'
             )
         )
+        
+        if not options['skip_statistics']:
+            self.stdout.write('Refreshing database statistics...')
+            statistics_count = refresh_statistics()
+            self.stdout.write(
+                self.style.SUCCESS(f'Refreshed {statistics_count} statistic blocks')
+            )
+        
+        if not options['skip_forest_data']:
+            self.stdout.write('Rebuilding forest plot dataset...')
+            forest_count = refresh_forest_data()
+            self.stdout.write(
+                self.style.SUCCESS(f'Wrote {forest_count} forest plot rows')
+            )
+        
+        if not options['skip_subgroup_results']:
+            self.stdout.write('Recomputing subgroup analysis results...')
+            subgroup_count = refresh_subgroup_results()
+            self.stdout.write(
+                self.style.SUCCESS(f'Wrote results for {subgroup_count} subgroups')
+            )
+        
+        if not (options['skip_forest_data'] and options['skip_subgroup_results']):
+            build_compressed_artifacts()
+            build_forest_stores()
 
     @transaction.atomic
     def import_studies(self, df):
@@ -0,0 +1,56 @@
+from django.core.management.base import BaseCommand, CommandError
+from ttedb.artifact_store import list_versions, publish_version, rollback_version
+from ttedb.artifacts import active_version
+from ttedb.forest_store import build_forest_stores
+from ttedb.precompressed import build_compressed_artifacts
+
+
+class Command(BaseCommand):
+    help = 'Publish the R analysis exports in ttedb/data as a new active version, or roll back'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--source',
+            type=str,
+            help='Directory holding the exports to publish (default: ttedb/data)'
+        )
+        parser.add_argument(
+            '--rollback',
+            nargs='?',
+            const='',
+            metavar='VERSION',
+            help='Reactivate VERSION, or the version published before the active one'
+        )
+        parser.add_argument(
+            '--list',
+            action='store_true',
+            help='List the published versions'
+        )
+
+    def handle(self, *args, **options):
+        if options['list']:
+            current = active_version()
+            for version in list_versions():
+                marker = '*' if version == current else ' '
+                self.stdout.write(f'{marker} {version}')
+            return
+
+        if options['rollback'] is not None:
+            try:
+                version = rollback_version(options['rollback'] or None)
+            except ValueError as e:
+                raise CommandError(str(e))
+            self.stdout.write(self.style.SUCCESS(f'Rolled back to analysis version {version}'))
+        else:
+            try:
+                version, published = publish_version(options['source'])
+            except ValueError as e:
+                raise CommandError(f'Analysis exports not published:\n{e}')
+            if not published:
+                self.stdout.write(f'Exports are unchanged; version {version} stays active')
+                return
+            self.stdout.write(self.style.SUCCESS(f'Published analysis version {version}'))
+
+        count = build_compressed_artifacts()
+        self.stdout.write(f'Wrote {count} pre-compressed artifact variants')
+        build_forest_stores()
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+from ttedb.forest_data import refresh_forest_data
+from ttedb.forest_store import build_forest_stores
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the forest plot dataset from the PICO comparisons in the database'
+
+    def handle(self, *args, **options):
+        self.stdout.write('Rebuilding forest plot dataset...')
+        count = refresh_forest_data()
+        build_forest_stores()
+        self.stdout.write(
+            self.style.SUCCESS(f'Successfully wrote {count} forest plot rows')
+        )
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from ttedb.statistics import refresh_statistics
+
+
+class Command(BaseCommand):
+    help = 'Recompute the precomputed database statistics served by the statistics API'
+
+    def handle(self, *args, **options):
+        self.stdout.write('Refreshing database statistics...')
+        count = refresh_statistics()
+        self.stdout.write(
+            self.style.SUCCESS(f'Successfully refreshed {count} statistic blocks')
+        )
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+from ttedb.precompressed import build_compressed_artifacts
+from ttedb.subgroups import refresh_subgroup_results
+
+
+class Command(BaseCommand):
+    help = 'Recompute the subgroup analysis results from the PICO comparisons in the database'
+
+    def handle(self, *args, **options):
+        self.stdout.write('Recomputing subgroup analysis results...')
+        count = refresh_subgroup_results()
+        build_compressed_artifacts()
+        self.stdout.write(
+            self.style.SUCCESS(f'Successfully wrote results for {count} subgroups')
+        )
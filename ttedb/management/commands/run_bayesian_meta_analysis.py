@@ -0,0 +1,104 @@
+import json
+import os
+import time
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from ttedb.artifacts import active_version, data_dir
+from ttedb.bayesian import DEFAULT_CHAINS, DEFAULT_DRAWS, DEFAULT_WARMUP, MIN_ESS, RHAT_THRESHOLD
+from ttedb.forest_plots import EFFECT_MEASURES, load_forest_columns, measure_columns
+from ttedb.posterior_update import POSTERIOR_FILENAME, load_posterior, save_posterior, update_results
+
+
+class Command(BaseCommand):
+    help = (
+        'Fit the hierarchical meta-analysis model to the forest plot rows with the NumPy sampler '
+        'and write meta_analysis_results.json'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chains', type=int, default=DEFAULT_CHAINS, help='Number of chains')
+        parser.add_argument('--warmup', type=int, default=DEFAULT_WARMUP, help='Warmup iterations per chain')
+        parser.add_argument('--draws', type=int, default=DEFAULT_DRAWS, help='Sampling iterations per chain')
+        parser.add_argument('--seed', type=int, help='Random seed, for reproducible results')
+        parser.add_argument('--workers', type=int, help='Processes to run the chains in (default: one per chain)')
+        parser.add_argument(
+            '--output',
+            type=str,
+            help='Directory to write meta_analysis_results.json to (default: ttedb/data)'
+        )
+        parser.add_argument(
+            '--incremental',
+            action='store_true',
+            help=(
+                'Update the posterior stored by the previous run for the added, removed or changed '
+                'studies instead of fitting every measure from scratch'
+            )
+        )
+        parser.add_argument(
+            '--publish',
+            action='store_true',
+            help='Publish the exports in ttedb/data as a new version afterwards'
+        )
+
+    def handle(self, *args, **options):
+        if options['chains'] < 1 or options['draws'] < 4 or options['warmup'] < 0:
+            raise CommandError('Need at least one chain, 4 draws and no negative warmup')
+
+        output_dir = options['output'] or data_dir()
+        posterior_path = os.path.join(output_dir, POSTERIOR_FILENAME)
+        posterior = load_posterior(posterior_path) if options['incremental'] else {}
+
+        forest_columns = load_forest_columns()
+        columns_by_measure = {
+            measure: measure_columns(forest_columns, measure) for measure in EFFECT_MEASURES
+        }
+
+        if options['incremental']:
+            self.stdout.write(f'Updating the stored posterior of {len(posterior)} measures...')
+        else:
+            self.stdout.write(
+                f"Sampling {options['chains']} chains of {options['warmup']} warmup + "
+                f"{options['draws']} draws..."
+            )
+        started = time.perf_counter()
+        results, posterior, updates = update_results(
+            columns_by_measure,
+            posterior,
+            chains=options['chains'],
+            warmup=options['warmup'],
+            draws=options['draws'],
+            seed=options['seed'],
+            workers=options['workers'],
+        )
+        elapsed = time.perf_counter() - started
+        if not results:
+            raise CommandError('No forest plot rows to analyse')
+
+        for measure, result in results.items():
+            line = (
+                f"{measure} ({updates[measure]}): {result['n_studies']} studies, mu = {result['pooled_estimate']} "
+                f"[{result['ci_lower']}, {result['ci_upper']}], tau = {result['tau']}"
+            )
+            if 'rhat' in result:
+                line += f", R-hat = {result['rhat']}, ESS = {result['ess']}"
+                if result['rhat'] > RHAT_THRESHOLD or result['ess'] < MIN_ESS:
+                    line = self.style.WARNING(f'{line} (not converged; sample longer)')
+            self.stdout.write(line)
+
+        os.makedirs(output_dir, exist_ok=True)
+        path = os.path.join(output_dir, 'meta_analysis_results.json')
+        temporary_path = f'{path}.{os.getpid()}.tmp'
+        with open(temporary_path, 'w') as f:
+            json.dump(results, f, indent=2)
+        os.replace(temporary_path, path)
+        save_posterior(posterior_path, posterior)
+        self.stdout.write(self.style.SUCCESS(f'Wrote {path} in {elapsed:.1f}s'))
+
+        if options['publish']:
+            call_command('publish_analysis', source=options['output'], stdout=self.stdout._out)
+        elif active_version() and os.path.abspath(output_dir) == os.path.abspath(data_dir()):
+            self.stdout.write(self.style.WARNING(
+                f'Version {active_version()} is being served, so the new results are not used until '
+                'they are published (rerun with --publish, or run publish_analysis)'
+            ))
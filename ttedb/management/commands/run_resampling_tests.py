@@ -0,0 +1,51 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from ttedb.precompressed import build_compressed_artifacts
+from ttedb.resampling import DEFAULT_RESAMPLES, RESAMPLING_RESULTS_FILENAME, refresh_resampling_results
+
+
+class Command(BaseCommand):
+    help = (
+        'Bootstrap the heterogeneity of every effect measure and permutation-test the subgroup '
+        f'differences, and write {RESAMPLING_RESULTS_FILENAME}'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--resamples', type=int, default=DEFAULT_RESAMPLES,
+            help='Bootstrap resamples and label permutations per analysis'
+        )
+        parser.add_argument(
+            '--seed', type=int,
+            help='Random seed (default: fresh entropy, recorded in the results so the run can be reproduced)'
+        )
+        parser.add_argument('--workers', type=int, help='Processes to resample in (default: one per CPU)')
+
+    def handle(self, *args, **options):
+        if options['resamples'] < 1:
+            raise CommandError('Need at least one resample')
+
+        self.stdout.write(f"Drawing {options['resamples']} resamples per analysis...")
+        started = time.perf_counter()
+        results = refresh_resampling_results(
+            options['resamples'], seed=options['seed'], workers=options['workers']
+        )
+        elapsed = time.perf_counter() - started
+
+        for measure, result in results['heterogeneity'].items():
+            self.stdout.write(
+                f"{measure}: tau² = {result['tau_squared']} {result['tau_squared_ci']}, "
+                f"I² = {result['i_squared']}% {result['i_squared_ci']}"
+            )
+        for dimension, result in results['subgroup_differences'].items():
+            self.stdout.write(
+                f"{dimension}: Q between = {result['q_between']} (df = {result['df']}), "
+                f"p = {result['q_pvalue']}, permutation p = {result['permutation_pvalue']}"
+            )
+        build_compressed_artifacts()
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Successfully wrote {RESAMPLING_RESULTS_FILENAME} in {elapsed:.1f}s (seed {results['seed']})"
+            )
+        )
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+from ttedb.watcher import POLL_INTERVAL, inotify_simple, watch_exports
+
+
+class Command(BaseCommand):
+    help = 'Watch ttedb/data and bump the dataset generation whenever the analysis exports change'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=POLL_INTERVAL,
+            help='Seconds between polls when inotify is unavailable'
+        )
+
+    def handle(self, *args, **options):
+        mode = 'inotify' if inotify_simple else f"polling every {options['interval']}s"
+        self.stdout.write(f'Watching analysis exports ({mode}); press Ctrl+C to stop')
+        try:
+            watch_exports(interval=options['interval'])
+        except KeyboardInterrupt:
+            pass
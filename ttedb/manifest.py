@@ -0,0 +1,113 @@
+"""
+Manifest of a published set of analysis exports.
+
+`publish_analysis` writes manifest.json into every version directory. It
+records the size, modification time and SHA-256 of each export together
+with the small summaries the analysis overview needs (available
+measures, subgroup counts, the descriptive overview, forest row counts),
+so the overview endpoint and the analysis page header read one small
+file instead of parsing every export. For exports that were never
+published, or versions published before manifests existed, the manifest
+is built from the exports themselves and kept in memory.
+"""
+import hashlib
+import json
+import os
+from datetime import datetime, timezone
+
+from .artifacts import (
+    MANIFEST_FILENAME, PUBLISHED_EXPORTS, active_version, data_dir, data_fingerprint,
+    load_artifact, version_dir
+)
+
+
+# (active version, exports fingerprint) -> manifest built from the exports
+_manifest_memo = [None, None]
+
+
+def file_entry(path):
+    """Size, modification time and content hash of one export"""
+    with open(path, 'rb') as f:
+        content = f.read()
+    stat = os.stat(path)
+    return {
+        'size': stat.st_size,
+        'modified': datetime.fromtimestamp(stat.st_mtime, tz=timezone.utc).isoformat(),
+        'sha256': hashlib.sha256(content).hexdigest(),
+    }
+
+
+def summaries(exports):
+    """The overview blocks of a set of parsed exports, keyed by filename"""
+    export_data = exports.get('export_summary.json')
+    meta_data = exports.get('meta_analysis_results.json')
+    descriptive_data = exports.get('descriptive_results.json')
+    subgroup_data = exports.get('subgroup_analysis_results.json')
+    forest_data = exports.get('forest_plot_data.json')
+
+    return {
+        'export_summary': export_data,
+        'meta_analysis_summary': {
+            'available_measures': list(meta_data.keys()) if meta_data else [],
+            'total_measures': len(meta_data) if meta_data else 0
+        },
+        'descriptive_summary': {
+            'overview': descriptive_data.get('overview') if descriptive_data else None
+        },
+        'subgroup_summary': {
+            'available_groupings': list(subgroup_data.keys()) if subgroup_data else [],
+            'total_subgroups': sum(len(v) for v in subgroup_data.values()) if subgroup_data else 0
+        },
+        'forest_plot_summary': {
+            'rows_by_measure': {measure: len(rows) for measure, rows in (forest_data or {}).items()},
+            'total_rows': sum(len(rows) for rows in (forest_data or {}).values()),
+        },
+    }
+
+
+def build_manifest(source_dir, version=None):
+    """Manifest of the exports in source_dir"""
+    files = {}
+    exports = {}
+    for filename in PUBLISHED_EXPORTS:
+        path = os.path.join(source_dir, filename)
+        if not os.path.exists(path):
+            continue
+        files[filename] = file_entry(path)
+        try:
+            with open(path, 'r') as f:
+                exports[filename] = json.load(f)
+        except json.JSONDecodeError:
+            continue
+
+    return {
+        'version': version,
+        'generated_at': datetime.now(timezone.utc).isoformat(),
+        'files': files,
+        **summaries(exports),
+    }
+
+
+def write_manifest(directory, version=None):
+    """Write the manifest of the exports in directory next to them"""
+    manifest = build_manifest(directory, version)
+    path = os.path.join(directory, MANIFEST_FILENAME)
+    temporary_path = f'{path}.{os.getpid()}.tmp'
+    with open(temporary_path, 'w') as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(temporary_path, path)
+    return manifest
+
+
+def load_manifest():
+    """Manifest of the exports being served"""
+    manifest = load_artifact(MANIFEST_FILENAME)
+    if manifest is not None:
+        return manifest
+
+    version = active_version()
+    key = (version, data_fingerprint(PUBLISHED_EXPORTS))
+    if _manifest_memo[0] != key:
+        source_dir = version_dir(version) if version else data_dir()
+        _manifest_memo[:] = [key, build_manifest(source_dir, version)]
+    return _manifest_memo[1]
@@ -0,0 +1,31 @@
+import time
+
+from django.conf import settings
+
+from .artifacts import dataset_generation, reset_artifact_caches
+
+
+class DatasetGenerationMiddleware:
+    """
+    Drop this worker's in-process artifact caches when the dataset
+    generation changes. The GENERATION file is read at most once every
+    TTEDB_GENERATION_CHECK_INTERVAL seconds, so new exports are picked up
+    within seconds without a restart. Cached forest plots and tabs are
+    keyed by content fingerprint, which is recomputed after the reset.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.interval = getattr(settings, 'TTEDB_GENERATION_CHECK_INTERVAL', 2)
+        self.generation = dataset_generation()
+        self.checked_at = time.monotonic()
+
+    def __call__(self, request):
+        now = time.monotonic()
+        if now - self.checked_at >= self.interval:
+            self.checked_at = now
+            generation = dataset_generation()
+            if generation != self.generation:
+                self.generation = generation
+                reset_artifact_caches()
+        return self.get_response(request)
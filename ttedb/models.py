@@ -1,4 +1,6 @@
 from django.db import models
+from django.db.models import BooleanField, Case, Count, F, FloatField, Q, Value, When
+from django.db.models.functions import Sign
 from django.urls import reverse
 from django.utils.text import slugify
 import uuid
@@ -120,6 +122,79 @@ class TTEStudy(models.Model):
         return None
 
 
+class PICOComparisonQuerySet(models.QuerySet):
+    """
+    QuerySet with database-side equivalents of the PICOComparison
+    concordance properties, so concordance rates can be aggregated in SQL.
+    """
+    
+    RATIO_MEASURES = ['HR', 'OR', 'RR']
+    
+    def with_estimates(self):
+        """Restrict to comparisons that report both TTE and RCT estimates"""
+        return self.filter(rct_estimate__isnull=False, tte_estimate__isnull=False)
+    
+    def with_concordance(self):
+        """
+        Annotate `ci_overlap` and `direction_concordant`, mirroring the
+        `estimates_overlap` and `concordance_direction` properties.
+        """
+        # Null value is 1.0 for ratio measures and 0.0 for difference measures
+        null_value = Case(
+            When(effect_measure__in=self.RATIO_MEASURES, then=Value(1.0)),
+            default=Value(0.0),
+            output_field=FloatField(),
+        )
+        return self.annotate(
+            ci_overlap=Case(
+                When(
+                    Q(tte_lb__isnull=True) | Q(tte_ub__isnull=True) |
+                    Q(rct_lb__isnull=True) | Q(rct_ub__isnull=True),
+                    then=Value(None),
+                ),
+                When(Q(tte_ub__lt=F('rct_lb')) | Q(rct_ub__lt=F('tte_lb')), then=Value(False)),
+                default=Value(True),
+                output_field=BooleanField(),
+            ),
+            rct_direction=Sign(F('rct_estimate') - null_value),
+            tte_direction=Sign(F('tte_estimate') - null_value),
+        ).annotate(
+            direction_concordant=Case(
+                When(Q(rct_estimate__isnull=True) | Q(tte_estimate__isnull=True), then=Value(None)),
+                When(rct_direction=F('tte_direction'), then=Value(True)),
+                default=Value(False),
+                output_field=BooleanField(),
+            ),
+        )
+    
+    def concordance_summary(self, *fields):
+        """
+        Count comparisons, CI overlaps and direction agreements in one query.
+        
+        Without fields a single summary dict is returned; with fields the
+        summary is grouped by them and returned as a list of dicts ordered
+        by the grouping fields.
+        """
+        aggregates = {
+            'total_comparisons': Count('id'),
+            'ci_overlap_count': Count('id', filter=Q(ci_overlap=True)),
+            'direction_concordant_count': Count('id', filter=Q(direction_concordant=True)),
+        }
+        queryset = self.with_concordance().order_by()
+        if fields:
+            rows = queryset.values(*fields).annotate(**aggregates).order_by(*fields)
+        else:
+            rows = [queryset.aggregate(**aggregates)]
+        
+        summaries = []
+        for row in rows:
+            total = row['total_comparisons']
+            row['ci_overlap_rate'] = (row['ci_overlap_count'] / total) * 100 if total else 0
+            row['direction_concordance_rate'] = (row['direction_concordant_count'] / total) * 100 if total else 0
+            summaries.append(row)
+        return summaries if fields else summaries[0]
+
+
 class PICOComparison(models.Model):
     """
     Model representing PICO elements and effect estimates for TTE vs RCT comparisons.
@@ -194,6 +269,8 @@ class PICOComparison(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    objects = PICOComparisonQuerySet.as_manager()
+    
     class Meta:
         ordering = ['tte_study', 'outcome']
         verbose_name = "PICO Comparison"
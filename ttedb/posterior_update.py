@@ -0,0 +1,243 @@
+"""
+Incremental updates of the Bayesian meta-analysis.
+
+Every run of `run_bayesian_meta_analysis` stores the posterior draws of
+each effect measure, with the studies they were fitted to, in
+bayesian_posterior.npz next to meta_analysis_results.json. An
+incremental run compares each measure's current studies with the stored
+ones and does no more work than the changes need:
+
+- unchanged studies: the stored posterior is kept;
+- added, removed or changed studies: the stored draws are importance-
+  reweighted by the likelihood of the added studies over that of the
+  removed ones (with theta integrated out, y ~ normal(mu, se² + tau²))
+  and resampled;
+- when the weights degenerate and too few effective draws remain,
+  short chains are run for that measure, warm-started from the stored
+  posterior;
+- a full re-fit from scratch only when the warm-started chains fail the
+  R-hat and ESS checks, or when a measure has no stored posterior.
+
+The posterior only depends on the (estimate, standard error) pairs of a
+measure's studies, so studies are matched on those pairs.
+"""
+import os
+from collections import Counter
+
+import numpy as np
+
+from .bayesian import (
+    DEFAULT_CHAINS, DEFAULT_DRAWS, DEFAULT_WARMUP, METHOD, MIN_ESS, RHAT_THRESHOLD,
+    draws_summary, measure_studies, run_chains, sampler_description, single_study_result, summaries
+)
+
+
+POSTERIOR_FILENAME = 'bayesian_posterior.npz'
+
+# Iterations of the warm-started chains; they start in the posterior, so
+# a short warmup suffices
+WARM_WARMUP = 200
+WARM_DRAWS = 2000
+
+# Decimals to which study estimates and SEs are matched
+STUDY_DECIMALS = 10
+
+POSTERIOR_FIELDS = ['mu', 'tau', 'effects', 'standard_errors', 'rhat', 'ess', 'sampler', 'estimation']
+
+
+def save_posterior(path, posterior):
+    """Write the posterior of every measure to path, atomically"""
+    arrays = {
+        f'{measure}.{field}': np.asarray(entry[field])
+        for measure, entry in posterior.items() for field in POSTERIOR_FIELDS
+    }
+    temporary_path = f'{path}.{os.getpid()}.tmp'
+    with open(temporary_path, 'wb') as f:
+        np.savez(f, **arrays)
+    os.replace(temporary_path, path)
+
+
+def load_posterior(path):
+    """Stored posterior keyed by measure, empty when there is none"""
+    if not os.path.exists(path):
+        return {}
+    posterior = {}
+    with np.load(path) as data:
+        for key in data.files:
+            measure, field = key.rsplit('.', 1)
+            posterior.setdefault(measure, {})[field] = data[key]
+    for entry in posterior.values():
+        entry['rhat'] = float(entry['rhat'])
+        entry['ess'] = int(entry['ess'])
+        entry['sampler'] = str(entry['sampler'])
+        entry['estimation'] = str(entry['estimation'])
+    return {measure: entry for measure, entry in posterior.items() if set(POSTERIOR_FIELDS) <= set(entry)}
+
+
+def study_changes(stored_effects, stored_standard_errors, effects, standard_errors):
+    """(added, removed) studies, each an array of (estimate, SE) rows"""
+    def study_counts(values, errors):
+        return Counter(zip(
+            np.round(values, STUDY_DECIMALS).tolist(), np.round(errors, STUDY_DECIMALS).tolist()
+        ))
+
+    stored = study_counts(stored_effects, stored_standard_errors)
+    current = study_counts(effects, standard_errors)
+    added = np.array(list((current - stored).elements()), dtype=float).reshape(-1, 2)
+    removed = np.array(list((stored - current).elements()), dtype=float).reshape(-1, 2)
+    return added, removed
+
+
+def marginal_log_likelihood(mu, tau, studies):
+    """Log likelihood of the (estimate, SE) studies at every draw of mu and tau"""
+    if not len(studies):
+        return np.zeros(len(mu))
+    effects, standard_errors = studies[:, 0], studies[:, 1]
+    variances = standard_errors[np.newaxis, :] ** 2 + tau[:, np.newaxis] ** 2
+    residuals = effects[np.newaxis, :] - mu[:, np.newaxis]
+    return -0.5 * (np.log(2 * np.pi * variances) + residuals ** 2 / variances).sum(axis=1)
+
+
+def importance_update(entry, added, removed, rng):
+    """
+    Stored draws reweighted for the added and removed studies and
+    resampled, in the stored (chains, draws) shape, with the number of
+    effective draws left.
+    """
+    shape = entry['mu'].shape
+    mu = entry['mu'].ravel()
+    tau = entry['tau'].ravel()
+    log_weights = marginal_log_likelihood(mu, tau, added) - marginal_log_likelihood(mu, tau, removed)
+    weights = np.exp(log_weights - log_weights.max())
+    weights /= weights.sum()
+
+    # Resampled draws repeat, so the stored effective size carries over
+    effective_draws = entry['ess'] / len(mu) / np.sum(weights ** 2)
+    index = rng.choice(len(mu), size=len(mu), p=weights)
+    return mu[index].reshape(shape), tau[index].reshape(shape), effective_draws
+
+
+def result_entry(measure, entry, decimals=4):
+    return {
+        'effect_measure': measure,
+        'n_studies': len(entry['effects']),
+        **draws_summary(entry['mu'], entry['tau'], decimals),
+        'method': METHOD,
+        'estimation': entry['estimation'],
+        'rhat': round(entry['rhat'], 3),
+        'ess': entry['ess'],
+    }
+
+
+def sample_measures(measures, studies, rng, posterior=None, **sampler_options):
+    """
+    Run chains for the given measures in one vectorized run, warm-started
+    from a random draw of each measure's stored posterior when one is
+    given. Returns the new posterior entry of every measure.
+    """
+    chains = sampler_options.get('chains', DEFAULT_CHAINS)
+    initial_log_tau = None
+    if posterior is not None:
+        initial_log_tau = np.log(np.stack([
+            rng.choice(posterior[measure]['tau'].ravel(), size=chains) for measure in measures
+        ], axis=1))
+
+    result = run_chains(
+        np.concatenate([studies[measure][0] for measure in measures]),
+        np.concatenate([studies[measure][1] for measure in measures]),
+        np.repeat(measures, [len(studies[measure][0]) for measure in measures]),
+        seed=int(rng.integers(2 ** 32)),
+        initial_log_tau=initial_log_tau,
+        **sampler_options
+    )
+    sampler = sampler_description(result)
+    entries = {}
+    for i, (measure, summary) in enumerate(summaries(result).items()):
+        entries[measure] = {
+            'mu': result['mu'][:, :, i],
+            'tau': result['tau'][:, :, i],
+            'effects': studies[measure][0],
+            'standard_errors': studies[measure][1],
+            'rhat': summary['rhat'],
+            'ess': summary['ess'],
+            'sampler': sampler,
+            'estimation': sampler,
+        }
+    return entries
+
+
+def converged(entry):
+    return entry['rhat'] <= RHAT_THRESHOLD and entry['ess'] >= MIN_ESS
+
+
+def update_results(columns_by_measure, posterior=None, seed=None, workers=None,
+                   chains=DEFAULT_CHAINS, warmup=DEFAULT_WARMUP, draws=DEFAULT_DRAWS):
+    """
+    Bayesian pooled results of the forest plot rows, in the schema of
+    meta_analysis_results.json, updated from a stored posterior where
+    possible; without one, every measure is fitted from scratch.
+
+    Returns (results, posterior, updates): the new posterior to store and
+    how each measure was updated ('unchanged', 'reweighted',
+    'warm-started', 'refit' or 'single study').
+    """
+    posterior = posterior or {}
+    rng = np.random.default_rng(seed)
+    studies = measure_studies(columns_by_measure)
+
+    updated = {}
+    updates = {}
+    results = {}
+    warm = []
+    refit = []
+    for measure, (effects, standard_errors) in studies.items():
+        if len(effects) == 1:
+            results[measure] = {'effect_measure': measure, **single_study_result(effects[0], standard_errors[0])}
+            updates[measure] = 'single study'
+            continue
+        entry = posterior.get(measure)
+        if entry is None:
+            refit.append(measure)
+            continue
+
+        added, removed = study_changes(entry['effects'], entry['standard_errors'], effects, standard_errors)
+        if not len(added) and not len(removed):
+            updated[measure] = entry
+            updates[measure] = 'unchanged'
+            continue
+
+        mu, tau, effective_draws = importance_update(entry, added, removed, rng)
+        if effective_draws < MIN_ESS:
+            warm.append(measure)
+            continue
+        updated[measure] = {
+            **entry,
+            'mu': mu,
+            'tau': tau,
+            'effects': effects,
+            'standard_errors': standard_errors,
+            'ess': int(effective_draws),
+            'estimation': f"{entry['sampler']}, importance-reweighted to the current {len(effects)} studies",
+        }
+        updates[measure] = 'reweighted'
+
+    options = {'chains': chains, 'workers': workers}
+    if warm:
+        entries = sample_measures(warm, studies, rng, posterior, warmup=WARM_WARMUP, draws=WARM_DRAWS, **options)
+        for measure, entry in entries.items():
+            if converged(entry):
+                updated[measure] = entry
+                updates[measure] = 'warm-started'
+            else:
+                # The posterior has drifted too far from the stored one
+                refit.append(measure)
+    if refit:
+        entries = sample_measures(refit, studies, rng, warmup=warmup, draws=draws, **options)
+        for measure, entry in entries.items():
+            updated[measure] = entry
+            updates[measure] = 'refit'
+
+    for measure, entry in updated.items():
+        results[measure] = result_entry(measure, entry)
+    ordered = [measure for measure in columns_by_measure if measure in results]
+    return {measure: results[measure] for measure in ordered}, updated, {measure: updates[measure] for measure in ordered}
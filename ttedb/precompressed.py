@@ -0,0 +1,162 @@
+"""
+Pre-compressed variants of the analysis exports.
+
+For every JSON file in ttedb/data/ the build step writes the compact
+JSON body the API would render, plus gzip and (when the optional
+`brotli` package is installed) brotli encodings of it, to
+ttedb/data/compressed/. Row exports keyed by effect measure are also
+sliced into one body per measure. Variant names carry the source's
+content fingerprint, so a regenerated export never serves stale
+variants: missing variants are built on first use, and the
+`build_compressed_artifacts` command (also run after each import)
+builds them ahead of time.
+"""
+import glob
+import gzip
+import json
+import os
+
+from django.http import FileResponse
+from django.utils.cache import patch_vary_headers
+
+from .artifacts import artifact_filenames, data_fingerprint, data_path, file_stat, load_artifact
+from .forest_data import FOREST_DATA_FILENAME
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+COMPRESSED_DIRNAME = 'compressed'
+
+# Exports keyed by effect measure that are also served one measure at a time
+SLICED_ARTIFACTS = ['forest_plot_data.json', FOREST_DATA_FILENAME]
+
+# (Content-Encoding, file suffix), in order of preference
+ENCODINGS = [('br', '.br'), ('gzip', '.gz')]
+
+
+def compressed_path(filename):
+    """Absolute path in ttedb/data/compressed"""
+    return data_path(os.path.join(COMPRESSED_DIRNAME, filename))
+
+
+def artifact_stem(filename):
+    return filename[:-len('.json')] if filename.endswith('.json') else filename
+
+
+def variant_name(filename, fingerprint, key=None):
+    """File name of the identity-encoded body of an export or one slice of it"""
+    parts = [artifact_stem(filename), key, fingerprint] if key else [artifact_stem(filename), fingerprint]
+    return '.'.join(parts) + '.json'
+
+
+def encode_json(data):
+    """The compact UTF-8 JSON that DRF's JSONRenderer produces for data"""
+    return json.dumps(data, ensure_ascii=False, separators=(',', ':'), allow_nan=False).encode('utf-8')
+
+
+def compress(body, encoding):
+    if encoding == 'gzip':
+        return gzip.compress(body, compresslevel=9, mtime=0)
+    return brotli.compress(body, quality=11)
+
+
+def available_encodings():
+    return [(encoding, suffix) for encoding, suffix in ENCODINGS if encoding != 'br' or brotli]
+
+
+def write_atomic(path, content):
+    temporary_path = f'{path}.{os.getpid()}.tmp'
+    with open(temporary_path, 'wb') as f:
+        f.write(content)
+    os.replace(temporary_path, path)
+
+
+def build_variants(filename):
+    """
+    Write the identity, gzip and brotli bodies of an export (and of its
+    per-measure slices) and remove variants of previous versions.
+    Returns the number of files written.
+    """
+    data = load_artifact(filename)
+    if data is None:
+        return 0
+
+    fingerprint = data_fingerprint([filename])
+    bodies = {None: encode_json(data)}
+    if filename in SLICED_ARTIFACTS:
+        for key, rows in data.items():
+            bodies[key] = encode_json({key: rows})
+
+    os.makedirs(compressed_path(''), exist_ok=True)
+    written = []
+    for key, body in bodies.items():
+        path = compressed_path(variant_name(filename, fingerprint, key))
+        write_atomic(path, body)
+        written.append(path)
+        for encoding, suffix in available_encodings():
+            write_atomic(path + suffix, compress(body, encoding))
+            written.append(path + suffix)
+
+    # Drop variants built from earlier versions of this export
+    for path in glob.glob(compressed_path(f'{glob.escape(artifact_stem(filename))}.*')):
+        if path not in written and not path.endswith('.tmp'):
+            os.remove(path)
+    return len(written)
+
+
+def build_compressed_artifacts():
+    """Build the variants of every JSON export in ttedb/data and return the file count"""
+    return sum(build_variants(filename) for filename in artifact_filenames())
+
+
+def accepted_encoding(request):
+    """The preferred available Content-Encoding accepted by the client, or None"""
+    accepted = {}
+    for item in request.META.get('HTTP_ACCEPT_ENCODING', '').split(','):
+        coding, _, params = item.strip().partition(';')
+        quality = 1.0
+        if params.strip().startswith('q='):
+            try:
+                quality = float(params.strip()[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[coding.strip().lower()] = quality
+
+    for encoding, _ in available_encodings():
+        if accepted.get(encoding, accepted.get('*', 0.0)) > 0:
+            return encoding
+    return None
+
+
+def precompressed_response(request, filename, key=None):
+    """
+    Stream the pre-encoded body of an export (or of one slice of it) in
+    the best encoding the client accepts. Returns None when the export or
+    the slice does not exist, so that the caller can fall back.
+    """
+    if file_stat(filename) is None:
+        return None
+
+    fingerprint = data_fingerprint([filename])
+    path = compressed_path(variant_name(filename, fingerprint, key))
+    if not os.path.exists(path):
+        # Only a missing build is rebuilt; a slice missing from a complete
+        # build is an unknown key and must not trigger a rebuild per request
+        if os.path.exists(compressed_path(variant_name(filename, fingerprint))):
+            return None
+        build_variants(filename)
+        if not os.path.exists(path):
+            return None
+
+    encoding = accepted_encoding(request)
+    suffix = dict(ENCODINGS).get(encoding, '')
+    response = FileResponse(open(path + suffix, 'rb'), content_type='application/json')
+    # FileResponse names the variant file in a Content-Disposition header; this is an API body
+    response.headers.pop('Content-Disposition', None)
+    if encoding:
+        response['Content-Encoding'] = encoding
+    patch_vary_headers(response, ['Accept-Encoding'])
+    return response
@@ -0,0 +1,258 @@
+"""
+Seeded permutation and bootstrap inference for heterogeneity and
+subgroup differences.
+
+Two resampling analyses complement the chi-square tests of
+`meta_analysis.pool()`:
+
+- bootstrap CIs of DerSimonian-Laird tau² and I² for every effect
+  measure, resampling its forest plot rows with replacement;
+- a permutation test for differences between the subgroups of every
+  grouping dimension in subgroups.py, permuting the subgroup labels.
+  The statistic is the mixed-effects between-subgroup Q (each subgroup
+  pooled with its own DL tau², as meta's test for subgroup differences).
+
+Resamples are drawn in blocks of RESAMPLE_BLOCK as 2-D (resamples x
+comparisons) arrays, whose statistics are row sums and `np.bincount`s
+with one bin per (resample, subgroup), so a block is a few array passes
+with no Python loop over resamples. Every block draws from its own
+stream spawned from the run seed and is an independent task in a
+process pool, so the results only depend on the seed and the number of
+resamples, not on the number of workers, and the runtime scales with
+the cores.
+
+`refresh_resampling_results()` writes the results to ttedb/data/ for
+the `run_resampling_tests` command.
+"""
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from .artifacts import bump_generation, data_path
+
+
+RESAMPLING_RESULTS_FILENAME = 'comparison_resampling_results.json'
+
+DEFAULT_RESAMPLES = 10000
+
+# Resamples drawn per task
+RESAMPLE_BLOCK = 500
+
+
+def dl_heterogeneity(effects, variances):
+    """
+    DL Q, tau² and I² of every row of 2-D (resamples x comparisons)
+    effects and variances
+    """
+    weights = 1.0 / variances
+    weights_sum = weights.sum(axis=1)
+    fixed_estimate = (weights * effects).sum(axis=1) / weights_sum
+    q_statistic = (weights * (effects - fixed_estimate[:, np.newaxis]) ** 2).sum(axis=1)
+    df = effects.shape[1] - 1
+    with np.errstate(divide='ignore', invalid='ignore'):
+        c = weights_sum - (weights ** 2).sum(axis=1) / weights_sum
+        tau_squared = np.maximum(np.where(c > 0, (q_statistic - df) / c, 0.0), 0.0)
+        i_squared = np.where(q_statistic > 0, np.maximum(0.0, (q_statistic - df) / q_statistic) * 100, 0.0)
+    return q_statistic, tau_squared, i_squared
+
+
+def between_subgroup_q(effects, variances, group_codes, n_groups):
+    """
+    Mixed-effects between-subgroup Q of every row of 2-D (resamples x
+    comparisons) subgroup codes, each subgroup pooled with its own DL
+    tau². Every row must use every code in range(n_groups).
+    """
+    size = group_codes.shape[0]
+    # One bin per (resample, subgroup)
+    bins = (group_codes + n_groups * np.arange(size)[:, np.newaxis]).ravel()
+    n_bins = size * n_groups
+    y = np.tile(effects, size)
+    v = np.tile(variances, size)
+
+    def bin_sum(values):
+        return np.bincount(bins, weights=values, minlength=n_bins)
+
+    weights = 1.0 / v
+    weights_sum = bin_sum(weights)
+    fixed_estimate = bin_sum(weights * y) / weights_sum
+    q_within = bin_sum(weights * (y - fixed_estimate[bins]) ** 2)
+    df = np.bincount(bins, minlength=n_bins) - 1
+    with np.errstate(divide='ignore', invalid='ignore'):
+        c = weights_sum - bin_sum(weights ** 2) / weights_sum
+        tau_squared = np.maximum(np.where(c > 0, (q_within - df) / c, 0.0), 0.0)
+
+    random_weights = 1.0 / (v + tau_squared[bins])
+    precision = bin_sum(random_weights).reshape(size, n_groups)
+    estimate = bin_sum(random_weights * y).reshape(size, n_groups) / precision
+    overall = (precision * estimate).sum(axis=1) / precision.sum(axis=1)
+    return (precision * (estimate - overall[:, np.newaxis]) ** 2).sum(axis=1)
+
+
+def bootstrap_block(effects, variances, size, seed):
+    """tau² and I² of `size` bootstrap resamples of the comparisons, shape (2, size)"""
+    rng = np.random.default_rng(seed)
+    rows = rng.integers(0, len(effects), size=(size, len(effects)))
+    _, tau_squared, i_squared = dl_heterogeneity(effects[rows], variances[rows])
+    return np.stack([tau_squared, i_squared])
+
+
+def permutation_block(effects, variances, group_index, n_groups, size, seed):
+    """Between-subgroup Q of `size` permutations of the subgroup labels"""
+    rng = np.random.default_rng(seed)
+    group_codes = rng.permuted(np.tile(group_index, (size, 1)), axis=1)
+    return between_subgroup_q(effects, variances, group_codes, n_groups)
+
+
+def run_resampling(jobs, seed=None, workers=None):
+    """
+    Run resampling jobs in blocks of RESAMPLE_BLOCK resamples.
+
+    jobs: dict of name -> (block function, arguments, resamples); the
+    function is called as function(*arguments, size, seed) and returns
+    the statistics of `size` resamples along its last axis
+    seed: seed of the whole run; each job, and each block of a job, gets
+    an independent stream
+    workers: processes to run the blocks in (one per CPU by default);
+    1 runs them in this process
+
+    Returns a dict of name -> statistics of all the job's resamples.
+    """
+    tasks = []
+    for (name, (function, arguments, resamples)), job_seed in zip(
+        jobs.items(), np.random.SeedSequence(seed).spawn(len(jobs))
+    ):
+        sizes = [min(RESAMPLE_BLOCK, resamples - start) for start in range(0, resamples, RESAMPLE_BLOCK)]
+        for size, block_seed in zip(sizes, job_seed.spawn(len(sizes))):
+            tasks.append((name, function, (*arguments, size, block_seed)))
+
+    workers = workers or os.cpu_count() or 1
+    if workers > 1 and len(tasks) > 1:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(function, *arguments) for _, function, arguments in tasks]
+            blocks = [future.result() for future in futures]
+    else:
+        blocks = [function(*arguments) for _, function, arguments in tasks]
+
+    statistics = {name: [] for name in jobs}
+    for (name, _, _), block in zip(tasks, blocks):
+        statistics[name].append(block)
+    return {name: np.concatenate(job_blocks, axis=-1) for name, job_blocks in statistics.items()}
+
+
+def heterogeneity_job(effects, standard_errors, resamples):
+    effects = np.asarray(effects, dtype=float)
+    variances = np.asarray(standard_errors, dtype=float) ** 2
+    return bootstrap_block, (effects, variances), resamples
+
+
+def subgroup_difference_job(effects, standard_errors, labels, resamples):
+    effects = np.asarray(effects, dtype=float)
+    variances = np.asarray(standard_errors, dtype=float) ** 2
+    levels, group_index = np.unique(np.asarray(labels).astype(str), return_inverse=True)
+    return permutation_block, (effects, variances, group_index, len(levels)), resamples
+
+
+def heterogeneity_summary(effects, standard_errors, draws, decimals=4):
+    """Observed DL heterogeneity with the percentile bootstrap CIs of tau² and I²"""
+    from scipy import stats
+
+    effects = np.asarray(effects, dtype=float)[np.newaxis, :]
+    variances = np.asarray(standard_errors, dtype=float)[np.newaxis, :] ** 2
+    q_statistic, tau_squared, i_squared = (float(value[0]) for value in dl_heterogeneity(effects, variances))
+    df = effects.shape[1] - 1
+    tau_ci = np.percentile(draws[0], [2.5, 97.5])
+    i_ci = np.percentile(draws[1], [2.5, 97.5])
+    return {
+        'n_studies': effects.shape[1],
+        'tau_squared': round(tau_squared, decimals),
+        'tau_squared_ci': [round(float(value), decimals) for value in tau_ci],
+        'i_squared': round(i_squared, decimals),
+        'i_squared_ci': [round(float(value), decimals) for value in i_ci],
+        'q_statistic': round(q_statistic, decimals),
+        'q_pvalue': round(float(stats.chi2.sf(q_statistic, df)), decimals),
+        'n_resamples': draws.shape[-1],
+        'method': 'Random-effects (DerSimonian-Laird), percentile bootstrap',
+    }
+
+
+def subgroup_difference_summary(effects, standard_errors, labels, draws, decimals=4):
+    """Observed between-subgroup Q with its chi-square and permutation p-values"""
+    from scipy import stats
+
+    levels, group_index = np.unique(np.asarray(labels).astype(str), return_inverse=True)
+    effects = np.asarray(effects, dtype=float)
+    variances = np.asarray(standard_errors, dtype=float) ** 2
+    n_groups = len(levels)
+    q_between = float(between_subgroup_q(effects, variances, group_index[np.newaxis, :], n_groups)[0])
+    df = n_groups - 1
+    # Permutations at least as extreme, counting the observed labelling
+    exceed = np.count_nonzero(draws >= q_between * (1 - 1e-12))
+    return {
+        'subgroups': levels.tolist(),
+        'n_studies': len(effects),
+        'q_between': round(q_between, decimals),
+        'df': df,
+        'q_pvalue': round(float(stats.chi2.sf(q_between, df)), decimals),
+        'permutation_pvalue': round(float(exceed + 1) / (len(draws) + 1), decimals),
+        'n_permutations': len(draws),
+        'method': 'Mixed-effects (DerSimonian-Laird within subgroups), permutation test',
+    }
+
+
+def resampling_results(resamples=DEFAULT_RESAMPLES, seed=None, workers=None):
+    """
+    Bootstrap heterogeneity of every effect measure's forest plot rows and
+    permutation tests of every subgroup dimension, all resampled in one
+    process pool. Without a seed, fresh entropy is drawn and recorded as
+    the seed of the results, so every run can be reproduced.
+    """
+    from .forest_plots import EFFECT_MEASURES, load_forest_columns, measure_columns
+    from .meta_analysis import standard_errors_from_ci
+    from .subgroups import SUBGROUP_DIMENSIONS, subgroup_rows
+
+    if seed is None:
+        seed = np.random.SeedSequence().entropy
+
+    data = {}
+    jobs = {}
+    forest_columns = load_forest_columns()
+    for measure in EFFECT_MEASURES:
+        columns = measure_columns(forest_columns, measure)
+        effects = np.asarray(columns['point_estimate'], dtype=float)
+        standard_errors = standard_errors_from_ci(columns['lower_ci'], columns['upper_ci'])
+        keep = np.isfinite(effects) & (standard_errors > 0)
+        if np.count_nonzero(keep) >= 2:
+            data[('heterogeneity', measure)] = (effects[keep], standard_errors[keep])
+            jobs[('heterogeneity', measure)] = heterogeneity_job(effects[keep], standard_errors[keep], resamples)
+
+    rows = subgroup_rows()
+    if rows is not None:
+        effects, standard_errors, columns = rows
+        for dimension, labels in SUBGROUP_DIMENSIONS.items():
+            labels = labels(columns).astype(str)
+            if len(set(labels)) >= 2:
+                data[('subgroup_differences', dimension)] = (effects, standard_errors, labels)
+                jobs[('subgroup_differences', dimension)] = subgroup_difference_job(
+                    effects, standard_errors, labels, resamples
+                )
+
+    draws = run_resampling(jobs, seed=seed, workers=workers)
+    results = {'seed': seed, 'n_resamples': resamples, 'heterogeneity': {}, 'subgroup_differences': {}}
+    for (analysis, name), arguments in data.items():
+        summary = heterogeneity_summary if analysis == 'heterogeneity' else subgroup_difference_summary
+        results[analysis][name] = summary(*arguments, draws[(analysis, name)])
+    return results
+
+
+def refresh_resampling_results(resamples=DEFAULT_RESAMPLES, seed=None, workers=None):
+    """Write the resampling results to ttedb/data and return them"""
+    results = resampling_results(resamples, seed=seed, workers=workers)
+    path = data_path(RESAMPLING_RESULTS_FILENAME)
+    temporary_path = f'{path}.{os.getpid()}.tmp'
+    with open(temporary_path, 'w') as f:
+        json.dump(results, f, indent=2)
+    os.replace(temporary_path, path)
+    bump_generation()
+    return results
@@ -0,0 +1,206 @@
+"""
+Precomputed database statistics.
+
+Every block of the statistics API is computed once by
+`refresh_statistics()` (run by the `refresh_statistics` management
+command and after each data import) and stored as one
+`DatabaseStatistic` row per block. Views read the stored snapshot and
+only fall back to computing the blocks live when it lacks a block.
+/api/statistics/overview/ serves the headline blocks and
+/api/statistics/blocks/<statistic_type>/ every block of one type.
+"""
+from django.db import transaction
+from django.db.models import Avg, Count, Max, Min
+from .models import TTEStudy, PICOComparison, LearningResource, DatabaseStatistic
+from . import aggregations
+
+
+def overview_statistics():
+    """Headline database counts"""
+    return {
+        'total_studies': TTEStudy.objects.count(),
+        'total_comparisons': PICOComparison.objects.count(),
+        'total_learning_resources': LearningResource.objects.count(),
+        'studies_with_comparisons_count': TTEStudy.objects.filter(
+            pico_comparisons__isnull=False
+        ).distinct().count(),
+    }
+
+
+def disease_distribution_statistics():
+    """Number of studies per disease category"""
+    return {
+        'disease_distribution': list(
+            TTEStudy.objects.values('disease_category').annotate(
+                count=Count('id')
+            ).order_by('-count')
+        ),
+    }
+
+
+def tte_general_statistics():
+    """Characteristics of TTE studies regardless of RCT comparisons"""
+    return {
+        'publication_timeline': list(
+            TTEStudy.objects.values('year').annotate(count=Count('id')).order_by('year')
+        ),
+        'data_type_distribution': list(
+            TTEStudy.objects.values('data_type').annotate(count=Count('id')).order_by('-count')
+        ),
+        'geographic_distribution': list(
+            TTEStudy.objects.exclude(
+                data_geography__isnull=True
+            ).exclude(data_geography__exact='').values('data_geography').annotate(
+                count=Count('id')
+            ).order_by('-count')[:10]
+        ),
+        'institution_type_distribution': list(
+            TTEStudy.objects.exclude(
+                institution_type__isnull=True
+            ).values('institution_type').annotate(count=Count('id')).order_by('-count')
+        ),
+        'sample_size_stats': TTEStudy.objects.exclude(
+            n_trt__isnull=True, n_ctrl__isnull=True
+        ).aggregate(
+            avg_treatment=Avg('n_trt'),
+            avg_control=Avg('n_ctrl'),
+            max_treatment=Max('n_trt'),
+            max_control=Max('n_ctrl'),
+            min_treatment=Min('n_trt'),
+            min_control=Min('n_ctrl'),
+        ),
+        'sample_size_distribution': aggregations.sample_size_distribution(),
+        'analysis_methods': list(
+            TTEStudy.objects.exclude(
+                analysis_method__isnull=True
+            ).exclude(analysis_method__exact='').values('analysis_method').annotate(
+                count=Count('id')
+            ).order_by('-count')[:10]
+        ),
+        'matching_methods': list(
+            TTEStudy.objects.exclude(
+                matching_method__isnull=True
+            ).exclude(matching_method__exact='').values('matching_method').annotate(
+                count=Count('id')
+            ).order_by('-count')[:10]
+        ),
+    }
+
+
+def tte_vs_rct_statistics():
+    """Concordance between TTE and RCT estimates"""
+    return {
+        'effect_measure_concordance': aggregations.effect_measure_concordance(),
+        'disease_concordance': aggregations.disease_concordance(),
+        'effect_measure_timeline': aggregations.effect_measure_timeline(),
+        'outcome_type_distribution': list(
+            PICOComparison.objects.values('outcome_type').annotate(
+                count=Count('id')
+            ).order_by('-count')
+        ),
+        'concordance_metrics': aggregations.concordance_metrics(),
+    }
+
+
+def transparency_statistics():
+    """Protocol, data and code sharing overall and by methodology"""
+    metrics = aggregations.transparency_and_methodology()
+    return {
+        'transparency_metrics': metrics['transparency_metrics'],
+        'transparency_by_methodology': metrics['transparency_by_methodology'],
+    }
+
+
+def methodology_statistics():
+    """DAG and QBA usage overall and over time"""
+    metrics = aggregations.transparency_and_methodology()
+    return {
+        'methodology_timeline': aggregations.methodology_timeline(),
+        'methodology_metrics': metrics['methodology_metrics'],
+    }
+
+
+# Builders keyed by DatabaseStatistic.statistic_type
+STATISTIC_BUILDERS = {
+    'overview': overview_statistics,
+    'tte_general': tte_general_statistics,
+    'disease_distribution': disease_distribution_statistics,
+    'tte_vs_rct': tte_vs_rct_statistics,
+    'transparency_metrics': transparency_statistics,
+    'methodology_trends': methodology_statistics,
+}
+
+
+# Block names stored for every statistic type, so that a snapshot taken
+# before a block was added is recognised as incomplete
+STATISTIC_BLOCKS = {
+    'overview': [
+        'total_studies', 'total_comparisons', 'total_learning_resources', 'studies_with_comparisons_count',
+    ],
+    'tte_general': [
+        'publication_timeline', 'data_type_distribution', 'geographic_distribution',
+        'institution_type_distribution', 'sample_size_stats', 'sample_size_distribution',
+        'analysis_methods', 'matching_methods',
+    ],
+    'disease_distribution': ['disease_distribution'],
+    'tte_vs_rct': [
+        'effect_measure_concordance', 'disease_concordance', 'effect_measure_timeline',
+        'outcome_type_distribution', 'concordance_metrics',
+    ],
+    'transparency_metrics': ['transparency_metrics', 'transparency_by_methodology'],
+    'methodology_trends': ['methodology_timeline', 'methodology_metrics'],
+}
+
+
+def compute_statistics(statistic_types=None):
+    """Compute statistic blocks live, keyed by (statistic_type, name)"""
+    blocks = {}
+    for statistic_type in statistic_types or STATISTIC_BUILDERS:
+        for name, value in STATISTIC_BUILDERS[statistic_type]().items():
+            blocks[(statistic_type, name)] = value
+    return blocks
+
+
+@transaction.atomic
+def refresh_statistics():
+    """Recompute every statistic block and store it as a DatabaseStatistic row"""
+    blocks = compute_statistics()
+    for (statistic_type, name), value in blocks.items():
+        DatabaseStatistic.objects.update_or_create(
+            statistic_type=statistic_type,
+            name=name,
+            defaults={
+                'value': value,
+                'description': STATISTIC_BUILDERS[statistic_type].__doc__,
+            },
+        )
+    # Drop rows for blocks that no longer exist
+    stale = DatabaseStatistic.objects.filter(statistic_type__in=STATISTIC_BUILDERS)
+    for statistic_type, name in blocks:
+        stale = stale.exclude(statistic_type=statistic_type, name=name)
+    stale.delete()
+    return len(blocks)
+
+
+def load_statistics(statistic_types=None):
+    """
+    Return (values, calculated_at) for the requested statistic types.
+
+    Values come from the stored snapshot when every block of
+    STATISTIC_BLOCKS is present, and are computed live otherwise, in
+    which case calculated_at is None.
+    """
+    statistic_types = list(statistic_types or STATISTIC_BUILDERS)
+    rows = DatabaseStatistic.objects.filter(statistic_type__in=statistic_types)
+    snapshot = {(row.statistic_type, row.name): row for row in rows}
+
+    expected = {
+        (statistic_type, name) for statistic_type in statistic_types for name in STATISTIC_BLOCKS[statistic_type]
+    }
+    if expected <= set(snapshot):
+        values = {name: snapshot[statistic_type, name].value for statistic_type, name in expected}
+        calculated_at = min(snapshot[key].calculated_at for key in expected)
+        return values, calculated_at
+
+    blocks = compute_statistics(statistic_types)
+    return {name: value for (_, name), value in blocks.items()}, None
@@ -0,0 +1,163 @@
+"""
+Subgroup analyses of the TTE-RCT differences, derived from the database.
+
+Mirrors the subgroup step of export_comprehensive_bayesian.R: the
+comparisons are cleaned as for the forest plot dataset (see
+forest_data.py), every comparison is labelled with its disease
+category, data source and publication year band, and the differences
+are pooled within every level of every dimension. All levels of all
+dimensions are pooled in a single `meta_analysis.pool()` call: the rows
+are stacked once per dimension with an integer group id per (dimension,
+level), so a new dimension only adds a labelling function to
+SUBGROUP_DIMENSIONS.
+
+The results are written to ttedb/data/ after each import, in the schema
+of the R-exported subgroup_analysis_results.json with the heterogeneity
+statistics added.
+"""
+import json
+import os
+import re
+
+import numpy as np
+
+from .artifacts import bump_generation, data_path, newest_artifact
+from .forest_data import comparison_columns, differences, outlier_mask
+
+
+SUBGROUP_RESULTS_FILENAME = 'comparison_subgroup_results.json'
+
+# Subgroup results the app can serve: the R export and the database results
+SUBGROUP_RESULT_FILES = ['subgroup_analysis_results.json', SUBGROUP_RESULTS_FILENAME]
+
+SUBGROUP_METHOD = 'REML'
+
+# (label, pattern) pairs tried in order against the lower-cased value, as in
+# R, except that 'immun' also matches the 'Immunology' category itself
+DISEASE_CATEGORIES = [
+    ('Cardiovascular', 'cardio|heart|coronary'),
+    ('Oncology', 'cancer|oncology|tumor'),
+    ('Endocrine/Metabolic', 'diabetes|endocrine|metabolic'),
+    ('Respiratory', 'respiratory|lung|asthma'),
+    ('Infectious Diseases', 'infection|hiv|covid'),
+    ('Nephrology', 'kidney|renal|nephro'),
+    ('Gastroenterology', 'gastro|ibd|crohn'),
+    ('Neurology', 'neuro|brain|stroke'),
+    ('Immunology', 'immun|rheum|arthritis'),
+]
+DATA_SOURCES = [
+    ('Claims', 'claims'),
+    ('EHR', 'ehr|electronic'),
+    ('Registry', 'registry'),
+    ('RCT Data', 'rct|trial'),
+]
+OTHER_LABEL = 'Other'
+
+
+def keyword_labels(values, categories, default=OTHER_LABEL):
+    """Label of every value: the first category whose pattern it matches"""
+    distinct, inverse = np.unique(np.array([str(value or '') for value in values]), return_inverse=True)
+    labels = np.array([
+        next((label for label, pattern in categories if re.search(pattern, value.lower())), default)
+        for value in distinct
+    ], dtype=object)
+    return labels[inverse]
+
+
+def year_labels(years):
+    years = np.array([np.nan if year is None else year for year in years], dtype=float)
+    return np.select(
+        [years <= 2019, years <= 2021, years >= 2022],
+        ['2019 and earlier', '2020-2021', '2022 and later'],
+        default='Unknown',
+    ).astype(object)
+
+
+# Grouping dimension -> label of every comparison, from the comparison columns
+SUBGROUP_DIMENSIONS = {
+    'disease': lambda columns: keyword_labels(columns['disease'], DISEASE_CATEGORIES),
+    'data_source': lambda columns: keyword_labels(columns['data_type'], DATA_SOURCES),
+    'publication_year': lambda columns: year_labels(columns['year']),
+}
+
+
+def subgroup_rows():
+    """
+    The comparisons subgroups are pooled from, cleaned as for the forest
+    plot dataset: (differences, standard errors, comparison columns), or
+    None when there are none.
+    """
+    columns = comparison_columns()
+    if columns is None:
+        return None
+
+    diff_estimate, diff_se, valid = differences(columns)
+    keep = valid & outlier_mask(diff_estimate, columns['effect_measure'], valid)
+    if not keep.any():
+        return None
+    return diff_estimate[keep], diff_se[keep], {name: values[keep] for name, values in columns.items()}
+
+
+def subgroup_results(method=SUBGROUP_METHOD, dimensions=SUBGROUP_DIMENSIONS):
+    """
+    Pooled differences of every subgroup level, keyed by dimension and
+    level, derived from the PICOComparison table.
+    """
+    from .meta_analysis import METHODS, pool, summaries
+
+    rows = subgroup_rows()
+    if rows is None:
+        return {}
+    diff_estimate, diff_se, kept = rows
+
+    # One integer group id per (dimension, level), over the rows stacked once per dimension
+    levels = []
+    group_ids = []
+    for dimension, labels in dimensions.items():
+        dimension_levels, codes = np.unique(labels(kept).astype(str), return_inverse=True)
+        group_ids.append(codes + len(levels))
+        levels.extend((dimension, level) for level in dimension_levels)
+
+    pooled = summaries(pool(
+        np.tile(diff_estimate, len(dimensions)),
+        np.tile(diff_se, len(dimensions)),
+        np.concatenate(group_ids),
+        method,
+    ))
+
+    results = {dimension: {} for dimension in dimensions}
+    for group, (dimension, level) in enumerate(levels):
+        summary = pooled[group]
+        results[dimension][level] = {
+            'pooled_estimate': summary['pooled_estimate'],
+            'ci_lower': summary['ci_lower'],
+            'ci_upper': summary['ci_upper'],
+            'n_studies': summary['n_studies'],
+            'tau_squared': summary['tau_squared'],
+            'i_squared': summary['i_squared'],
+            'q_statistic': summary['q_statistic'],
+            'q_pvalue': summary['q_pvalue'],
+            'method': METHODS[method],
+        }
+    return results
+
+
+def refresh_subgroup_results():
+    """Write the database subgroup results to ttedb/data and return the number of subgroups"""
+    results = subgroup_results()
+    path = data_path(SUBGROUP_RESULTS_FILENAME)
+    temporary_path = f'{path}.{os.getpid()}.tmp'
+    with open(temporary_path, 'w') as f:
+        json.dump(results, f, indent=2)
+    os.replace(temporary_path, path)
+    bump_generation()
+    return sum(len(levels) for levels in results.values())
+
+
+def subgroup_results_filename():
+    """
+    The subgroup results in use: whichever is newer of the R export and
+    the results derived from PICOComparison at import time, or None when
+    neither exists.
+    """
+    return newest_artifact(SUBGROUP_RESULT_FILES)
@@ -1,3 +1,453 @@
-from django.test import TestCase
+import csv
+import io
+import json
+import os
+import shutil
+import tempfile
 
-# Create your tests here.
+import numpy as np
+from django.http import QueryDict
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from .artifacts import reset_artifact_caches
+from .bayesian import run_chains, split_rhat
+from .bulk_export import export_fields, export_lines
+from .cumulative import cumulative_pooling
+from .forest_query import is_query, parse_filters, parse_ordering, row_dicts, select_rows
+from .forest_store import rows_to_columns
+from .influence import influence
+from .meta_analysis import pool
+from .models import DatabaseStatistic, PICOComparison, TTEStudy
+from .resampling import between_subgroup_q, heterogeneity_job, run_resampling
+from .statistics import STATISTIC_BLOCKS, compute_statistics, load_statistics, refresh_statistics
+
+
+# metafor's dat.bcg: BCG vaccine trials (tpos, tneg, cpos, cneg)
+BCG_COUNTS = np.array([
+    [4, 119, 11, 128], [6, 300, 29, 274], [3, 228, 11, 209], [62, 13536, 248, 12619],
+    [33, 5036, 47, 5761], [180, 1361, 372, 1079], [8, 2537, 10, 619], [505, 87886, 499, 87892],
+    [29, 7470, 45, 7232], [17, 1699, 65, 1600], [186, 50448, 141, 27197], [5, 2493, 3, 2338],
+    [27, 16886, 29, 17825],
+], dtype=float)
+
+
+def bcg_log_risk_ratios():
+    """Log risk ratios and standard errors of dat.bcg, as escalc(measure='RR')"""
+    tpos, tneg, cpos, cneg = BCG_COUNTS.T
+    effects = np.log(tpos / (tpos + tneg)) - np.log(cpos / (cpos + cneg))
+    variances = 1 / tpos - 1 / (tpos + tneg) + 1 / cpos - 1 / (cpos + cneg)
+    return effects, np.sqrt(variances)
+
+
+class PoolTests(SimpleTestCase):
+    """pool() against metafor's rma() on dat.bcg"""
+
+    # method -> (estimate, se, tau², ci_lower, ci_upper) reported by metafor
+    METAFOR = {
+        'FE': (-0.4303, 0.0405, 0.0, -0.5097, -0.3509),
+        'DL': (-0.7141, 0.1787, 0.3088, -1.0645, -0.3638),
+        'PM': (-0.7150, 0.1809, 0.3181, -1.0695, -0.3604),
+        'REML': (-0.7145, 0.1798, 0.3132, -1.0669, -0.3622),
+    }
+
+    def test_matches_metafor(self):
+        effects, standard_errors = bcg_log_risk_ratios()
+        for method, expected in self.METAFOR.items():
+            result = pool(effects, standard_errors, method=method)
+            actual = [result[field][0] for field in ['pooled_estimate', 'pooled_se', 'tau_squared', 'ci_lower', 'ci_upper']]
+            for value, reference in zip(actual, expected):
+                self.assertAlmostEqual(value, reference, places=4, msg=method)
+            self.assertAlmostEqual(result['q_statistic'][0], 152.2330, places=4)
+            self.assertAlmostEqual(result['i_squared'][0], 92.1173, places=4)
+
+    def test_groups_are_pooled_separately(self):
+        effects, standard_errors = bcg_log_risk_ratios()
+        groups = np.arange(len(effects)) % 2
+        result = pool(effects, standard_errors, groups, method='REML')
+        for group in [0, 1]:
+            alone = pool(effects[groups == group], standard_errors[groups == group], method='REML')
+            self.assertAlmostEqual(result['pooled_estimate'][group], alone['pooled_estimate'][0], places=10)
+            self.assertAlmostEqual(result['tau_squared'][group], alone['tau_squared'][0], places=10)
+
+
+class InfluenceTests(SimpleTestCase):
+    """Leave-one-out diagnostics against refitting without every study"""
+
+    def test_matches_refits(self):
+        effects, standard_errors = bcg_log_risk_ratios()
+        result = influence(effects, standard_errors, block_rows=5)
+        for i in range(len(effects)):
+            keep = np.arange(len(effects)) != i
+            refit = pool(effects[keep], standard_errors[keep], method='DL')
+            self.assertAlmostEqual(result['loo_estimate'][i], refit['pooled_estimate'][0], places=10)
+            self.assertAlmostEqual(result['loo_se'][i], refit['pooled_se'][0], places=10)
+            self.assertAlmostEqual(result['loo_tau_squared'][i], refit['tau_squared'][0], places=10)
+            self.assertAlmostEqual(result['loo_q_statistic'][i], refit['q_statistic'][0], places=8)
+            rstudent = (effects[i] - refit['pooled_estimate'][0]) / np.sqrt(
+                standard_errors[i] ** 2 + refit['tau_squared'][0] + refit['pooled_se'][0] ** 2
+            )
+            self.assertAlmostEqual(result['rstudent'][i], rstudent, places=10)
+
+        full = pool(effects, standard_errors, method='DL')
+        self.assertAlmostEqual(result['pooled_estimate'], full['pooled_estimate'][0], places=10)
+        self.assertAlmostEqual(result['weight'].sum(), 100.0, places=10)
+
+    def test_single_study(self):
+        result = influence([0.2], [0.1])
+        self.assertEqual(result['n_studies'], 1)
+        self.assertFalse(result['influential'].any())
+
+
+class CumulativeTests(SimpleTestCase):
+
+    def test_every_step_matches_pooling_its_prefix(self):
+        effects, standard_errors = bcg_log_risk_ratios()
+        ends = np.arange(1, len(effects) + 1)
+        result = cumulative_pooling(effects, standard_errors, ends, block_steps=4)
+        for step, end in enumerate(ends):
+            prefix = pool(effects[:end], standard_errors[:end], method='DL')
+            self.assertAlmostEqual(result['pooled_estimate'][step], prefix['pooled_estimate'][0], places=10)
+            self.assertAlmostEqual(result['pooled_se'][step], prefix['pooled_se'][0], places=10)
+            self.assertAlmostEqual(result['tau_squared'][step], prefix['tau_squared'][0], places=10)
+        self.assertEqual(result['q_statistic'][0], 0.0)
+
+    def test_last_step_is_the_full_pool(self):
+        effects, standard_errors = bcg_log_risk_ratios()
+        result = cumulative_pooling(effects, standard_errors, [3, 9, len(effects)])
+        full = pool(effects, standard_errors, method='DL')
+        for field in ['pooled_estimate', 'ci_lower', 'ci_upper', 'tau_squared', 'q_statistic', 'i_squared']:
+            self.assertAlmostEqual(result[field][-1], full[field][0], places=10)
+        self.assertEqual(list(result['n_studies']), [3, 9, len(effects)])
+
+
+class BayesianTests(SimpleTestCase):
+
+    def test_seeded_chains_are_reproducible(self):
+        effects, standard_errors = bcg_log_risk_ratios()
+        groups = np.zeros(len(effects))
+        first = run_chains(effects, standard_errors, groups, chains=2, warmup=200, draws=1000, seed=3, workers=1)
+        second = run_chains(effects, standard_errors, groups, chains=2, warmup=200, draws=1000, seed=3, workers=1)
+        np.testing.assert_array_equal(first['mu'], second['mu'])
+        np.testing.assert_array_equal(first['tau'], second['tau'])
+
+        # Close to the frequentist random-effects estimate, and converged
+        self.assertAlmostEqual(first['mu'].mean(), -0.71, delta=0.1)
+        self.assertLess(split_rhat(first['mu'][:, :, 0]), 1.05)
+
+
+class ResamplingTests(SimpleTestCase):
+
+    def test_between_subgroup_q_matches_pooling(self):
+        effects, standard_errors = bcg_log_risk_ratios()
+        groups = np.arange(len(effects)) % 3
+        pooled = pool(effects, standard_errors, groups, method='DL')
+        precision = 1 / pooled['pooled_se'] ** 2
+        overall = np.sum(precision * pooled['pooled_estimate']) / precision.sum()
+        expected = np.sum(precision * (pooled['pooled_estimate'] - overall) ** 2)
+        actual = between_subgroup_q(effects, standard_errors ** 2, groups[np.newaxis, :], 3)[0]
+        self.assertAlmostEqual(actual, expected, places=10)
+
+    def test_results_do_not_depend_on_workers(self):
+        effects, standard_errors = bcg_log_risk_ratios()
+        jobs = {'bcg': heterogeneity_job(effects, standard_errors, 1200)}
+        one = run_resampling(jobs, seed=11, workers=1)['bcg']
+        two = run_resampling(jobs, seed=11, workers=2)['bcg']
+        self.assertEqual(one.shape, (2, 1200))
+        np.testing.assert_array_equal(one, two)
+
+
+def make_study(**fields):
+    defaults = {'first_author': 'Author', 'year': 2021, 'disease': 'Disease', 'data_type': 'Claims'}
+    defaults.update(fields)
+    defaults.setdefault('doi', f"https://doi.org/10.1000/{defaults['first_author']}")
+    return TTEStudy.objects.create(**defaults)
+
+
+class ConcordanceQuerySetTests(TestCase):
+    """with_concordance() annotations against the model properties"""
+
+    COMPARISONS = [
+        # effect_measure, tte (estimate, lb, ub), rct (estimate, lb, ub)
+        ('HR', (0.8, 0.6, 0.9), (0.7, 0.5, 0.95)),   # same direction, overlapping
+        ('HR', (1.2, 1.1, 1.4), (0.7, 0.5, 0.95)),   # opposite direction, disjoint
+        ('HR', (1.0, 0.8, 1.2), (1.0, 0.9, 1.1)),    # both exactly null
+        ('OR', (1.0, 0.8, 1.2), (0.9, 0.8, 1.0)),    # null vs benefit
+        ('RR', (0.9, 0.8, 1.0), (0.75, 0.7, 0.8)),   # intervals touching at 0.8
+        ('MD', (-0.5, -1.0, 0.0), (0.3, 0.1, 0.5)),  # difference measure, opposite
+        ('RD', (0.0, -0.1, 0.1), (0.0, -0.2, 0.2)),  # difference measure, both null
+        ('SMD', (0.2, 0.1, 0.3), (-0.1, -0.3, 0.1)),  # difference measure, opposite, disjoint
+        ('MD', (1.0, 0.5, 1.5), (0.8, 0.2, 1.4)),    # same direction around 0, not 1
+    ]
+
+    def setUp(self):
+        study = make_study()
+        for i, (measure, tte, rct) in enumerate(self.COMPARISONS):
+            PICOComparison.objects.create(
+                tte_study=study, target_trial_name=f'Trial {i}', population='p', intervention='i',
+                comparison='c', outcome=f'Outcome {i}', outcome_type='efficacy', effect_measure=measure,
+                tte_estimate=tte[0], tte_lb=tte[1], tte_ub=tte[2],
+                rct_estimate=rct[0], rct_lb=rct[1], rct_ub=rct[2],
+            )
+
+    def test_annotations_match_properties(self):
+        comparisons = PICOComparison.objects.with_concordance()
+        self.assertEqual(comparisons.count(), len(self.COMPARISONS))
+        for comparison in comparisons:
+            self.assertEqual(comparison.ci_overlap, comparison.estimates_overlap, comparison.target_trial_name)
+            self.assertEqual(
+                comparison.direction_concordant, comparison.concordance_direction, comparison.target_trial_name
+            )
+
+    def test_summary_matches_properties(self):
+        comparisons = list(PICOComparison.objects.with_estimates())
+        summary = PICOComparison.objects.with_estimates().concordance_summary()
+        self.assertEqual(summary['total_comparisons'], len(comparisons))
+        self.assertEqual(summary['ci_overlap_count'], sum(c.estimates_overlap is True for c in comparisons))
+        self.assertEqual(
+            summary['direction_concordant_count'], sum(c.concordance_direction is True for c in comparisons)
+        )
+
+        grouped = PICOComparison.objects.with_estimates().concordance_summary('effect_measure')
+        self.assertEqual(
+            {row['effect_measure']: row['total_comparisons'] for row in grouped},
+            {'HR': 3, 'OR': 1, 'RR': 1, 'MD': 2, 'RD': 1, 'SMD': 1},
+        )
+
+
+class StatisticsSnapshotTests(TestCase):
+    """DatabaseStatistic snapshots and their live fallback"""
+
+    def setUp(self):
+        make_study()
+
+    def test_block_names_match_builders(self):
+        self.assertEqual(
+            set(compute_statistics()),
+            {(statistic_type, name) for statistic_type, names in STATISTIC_BLOCKS.items() for name in names},
+        )
+
+    def test_incomplete_snapshot_is_computed_live(self):
+        refresh_statistics()
+        statistics, calculated_at = load_statistics(['overview', 'tte_vs_rct'])
+        self.assertIsNotNone(calculated_at)
+        self.assertEqual(statistics['total_studies'], 1)
+
+        DatabaseStatistic.objects.filter(statistic_type='tte_vs_rct', name='concordance_metrics').delete()
+        statistics, calculated_at = load_statistics(['overview', 'tte_vs_rct'])
+        self.assertIsNone(calculated_at)
+        self.assertIn('concordance_metrics', statistics)
+
+    def test_blocks_endpoint(self):
+        refresh_statistics()
+        response = self.client.get('/api/statistics/blocks/transparency_metrics/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            set(response.json()),
+            set(STATISTIC_BLOCKS['transparency_metrics']) | {'statistics_calculated_at'},
+        )
+        self.assertEqual(self.client.get('/api/statistics/blocks/unknown/').status_code, 404)
+
+
+FOREST_ROWS = {
+    'hr': [
+        {'author': 'Adams', 'year': 2019, 'point_estimate': 0.1, 'lower_ci': -0.1, 'upper_ci': 0.3,
+         'sample_size': 500, 'disease': 'Heart failure', 'target_trial_name': 'Trial A'},
+        {'author': 'Baker', 'year': 2021, 'point_estimate': -0.2, 'lower_ci': -0.3, 'upper_ci': -0.1,
+         'sample_size': 2000, 'disease': 'Diabetes', 'target_trial_name': 'Trial B'},
+        {'author': 'Clark', 'year': 2023, 'point_estimate': 0.05, 'lower_ci': -0.4, 'upper_ci': 0.5,
+         'disease': 'heart failure', 'target_trial_name': 'Trial C'},
+    ],
+    'or': [
+        {'author': 'Davis', 'year': 2020, 'point_estimate': 0.3, 'lower_ci': 0.1, 'upper_ci': 0.5,
+         'sample_size': 800, 'disease': 'Stroke', 'target_trial_name': 'Trial D'},
+        {'author': 'Baker', 'year': 2022, 'point_estimate': 0.0, 'lower_ci': -0.05, 'upper_ci': 0.05,
+         'sample_size': 100, 'disease': 'Diabetes', 'target_trial_name': 'Trial E'},
+    ],
+}
+
+
+def forest_columns():
+    from .forest_plots import get_forest_plot_data
+    return {measure: rows_to_columns(get_forest_plot_data(measure, FOREST_ROWS)) for measure in FOREST_ROWS}
+
+
+class ForestQueryTests(SimpleTestCase):
+
+    def select(self, measures=('HR', 'OR'), filters=None, ordering=''):
+        columns = forest_columns()
+        measure_ids, row_ids = select_rows(columns, list(measures), filters or {}, parse_ordering(ordering))
+        return [(row['effect_measure'], row['author']) for row in row_dicts(columns, measure_ids, row_ids)]
+
+    def test_is_query(self):
+        self.assertFalse(is_query(QueryDict('')))
+        self.assertFalse(is_query(QueryDict('effect_measure=HR')))
+        self.assertTrue(is_query(QueryDict('effect_measure=HR,OR')))
+        self.assertTrue(is_query(QueryDict('effect_measure=HR&limit=5')))
+        self.assertTrue(is_query(QueryDict('min_year=2020')))
+
+    def test_parse_filters(self):
+        self.assertEqual(
+            parse_filters(QueryDict('min_year=2020&author= BaK &disease=Diabetes')),
+            {'min_year': 2020, 'author': 'bak', 'disease': 'diabetes'},
+        )
+        with self.assertRaises(ValueError):
+            parse_filters(QueryDict('max_year=recent'))
+
+    def test_parse_ordering(self):
+        self.assertEqual(parse_ordering('-precision,year'), [('precision', True), ('year', False)])
+        self.assertEqual(parse_ordering(''), [])
+        with self.assertRaises(ValueError):
+            parse_ordering('title')
+
+    def test_display_order_by_measure(self):
+        self.assertEqual(
+            self.select(),
+            [('HR', 'Adams'), ('HR', 'Baker'), ('HR', 'Clark'), ('OR', 'Davis'), ('OR', 'Baker')],
+        )
+        self.assertEqual(self.select(measures=['OR', 'XX']), [('OR', 'Davis'), ('OR', 'Baker')])
+
+    def test_filters(self):
+        self.assertEqual(self.select(filters={'min_year': 2021, 'max_year': 2022}), [('HR', 'Baker'), ('OR', 'Baker')])
+        self.assertEqual(self.select(filters={'author': 'ak'}), [('HR', 'Baker'), ('OR', 'Baker')])
+        # Categorical filters are exact but case-insensitive
+        self.assertEqual(self.select(filters={'disease': 'heart failure'}), [('HR', 'Adams'), ('HR', 'Clark')])
+        self.assertEqual(self.select(filters={'target_trial': 'trial d'}), [('OR', 'Davis')])
+        self.assertEqual(self.select(filters={'disease': 'heart'}), [])
+
+    def test_rows_without_a_target_trial_match_no_target_trial(self):
+        rows = {'hr': FOREST_ROWS['hr'] + [
+            {'author': 'Evans', 'year': 2020, 'point_estimate': 0.2, 'lower_ci': 0.0, 'upper_ci': 0.4},
+        ]}
+        from .forest_plots import get_forest_plot_data
+        columns = {'hr': rows_to_columns(get_forest_plot_data('HR', rows))}
+        self.assertEqual(list(columns['hr']['target_trial']), ['Trial A', '', 'Trial B', 'Trial C'])
+        _, row_ids = select_rows(columns, ['HR'], {'target_trial': 'target trial'}, [])
+        self.assertEqual(row_ids.size, 0)
+
+    def test_ordering(self):
+        self.assertEqual(
+            [author for _, author in self.select(ordering='-year')],
+            ['Clark', 'Baker', 'Baker', 'Davis', 'Adams'],
+        )
+        # Ties keep the display order: HR rows come before OR rows
+        self.assertEqual(
+            self.select(ordering='author'),
+            [('HR', 'Adams'), ('HR', 'Baker'), ('OR', 'Baker'), ('HR', 'Clark'), ('OR', 'Davis')],
+        )
+        self.assertEqual(
+            [author for _, author in self.select(ordering='-precision')],
+            ['Baker', 'Baker', 'Adams', 'Davis', 'Clark'],
+        )
+        self.assertEqual(
+            [author for _, author in self.select(ordering='-author,year')],
+            ['Davis', 'Clark', 'Baker', 'Baker', 'Adams'],
+        )
+
+
+class ForestRowQueryApiTests(SimpleTestCase):
+    """The ?effect_measure=, filter, ordering and paging parameters of forest-plot-data"""
+
+    def setUp(self):
+        self.base_dir = tempfile.mkdtemp()
+        data_dir = os.path.join(self.base_dir, 'ttedb', 'data')
+        os.makedirs(data_dir)
+        with open(os.path.join(data_dir, 'forest_plot_data.json'), 'w') as f:
+            json.dump(FOREST_ROWS, f)
+        self.settings_override = override_settings(
+            BASE_DIR=self.base_dir,
+            CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}},
+        )
+        self.settings_override.enable()
+        reset_artifact_caches()
+
+    def tearDown(self):
+        self.settings_override.disable()
+        reset_artifact_caches()
+        shutil.rmtree(self.base_dir, ignore_errors=True)
+
+    def get(self, query):
+        response = self.client.get(f'/api/analysis/forest-plot-data/?{query}', HTTP_ACCEPT='application/json')
+        body = b''.join(response.streaming_content) if response.streaming else response.content
+        return response, json.loads(body)
+
+    def test_comma_separated_measures_without_other_parameters(self):
+        response, data = self.get('effect_measure=HR,OR')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(data['count'], 5)
+        _, limited = self.get('effect_measure=HR,OR&limit=1000')
+        self.assertEqual(limited['results'], data['results'])
+
+    def test_single_measure_is_keyed(self):
+        response, data = self.get('effect_measure=or')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(list(data), ['or'])
+        self.assertEqual(len(data['or']), 2)
+
+    def test_paging_and_ordering(self):
+        _, data = self.get('ordering=year&limit=2&offset=1')
+        self.assertEqual(data['count'], 5)
+        self.assertEqual([row['year'] for row in data['results']], [2020, 2021])
+        self.assertIsNotNone(data['next'])
+
+    def test_filters(self):
+        _, data = self.get('effect_measure=HR,OR&disease=DIABETES')
+        self.assertEqual([row['author'] for row in data['results']], ['Baker', 'Baker'])
+        self.assertEqual([row['effect_measure'] for row in data['results']], ['HR', 'OR'])
+
+    def test_malformed_parameters(self):
+        self.assertEqual(self.get('ordering=title')[0].status_code, 400)
+        self.assertEqual(self.get('min_year=soon')[0].status_code, 400)
+
+
+class BulkExportTests(TestCase):
+    """The streamed NDJSON and CSV exports of the comparisons"""
+
+    def setUp(self):
+        adams = make_study(first_author='Adams', year=2020)
+        baker = make_study(first_author='Baker', year=2022)
+        for study, measure, outcome in [
+            (adams, 'HR', 'Mortality'), (baker, 'HR', 'Stroke'), (baker, 'OR', 'Bleeding'), (adams, 'HR', 'Death'),
+        ]:
+            PICOComparison.objects.create(
+                tte_study=study, target_trial_name='Trial', population='p', intervention='i', comparison='c',
+                outcome=outcome, outcome_type='efficacy', effect_measure=measure,
+                tte_estimate=0.8, tte_lb=0.6, tte_ub=1.1, rct_estimate=0.9, rct_lb=0.7, rct_ub=1.2,
+            )
+
+    def export(self, export_format, query):
+        response = self.client.get(f'/api/pico-comparisons/export/{export_format}/?{query}')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        self.assertEqual(
+            response['Content-Disposition'], f'attachment; filename="pico-comparisons.{export_format}"'
+        )
+        return response, b''.join(response.streaming_content).decode()
+
+    def test_ndjson_rows_follow_the_list_filters(self):
+        response, body = self.export('ndjson', 'effect_measure=HR&ordering=outcome')
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        rows = [json.loads(line) for line in body.splitlines()]
+        self.assertEqual([row['outcome'] for row in rows], ['Death', 'Mortality', 'Stroke'])
+        self.assertEqual([row['tte_study_author'] for row in rows], ['Adams', 'Adams', 'Baker'])
+        self.assertEqual(
+            [row['id'] for row in rows],
+            list(PICOComparison.objects.filter(effect_measure='HR').order_by('outcome').values_list('id', flat=True)),
+        )
+        self.assertEqual(rows[0]['tte_estimate'], 0.8)
+
+    def test_csv_header_and_rows(self):
+        response, body = self.export('csv', 'search=stroke')
+        self.assertEqual(response['Content-Type'], 'text/csv; charset=utf-8')
+        header, *rows = csv.reader(io.StringIO(body))
+        self.assertEqual(
+            header,
+            export_fields(PICOComparison) + ['tte_study_slug', 'tte_study_author', 'tte_study_year'],
+        )
+        self.assertEqual(len(rows), 1)
+        row = dict(zip(header, rows[0]))
+        self.assertEqual((row['outcome'], row['effect_measure'], row['tte_study_year']), ('Stroke', 'HR', '2022'))
+
+    def test_rows_are_written_in_chunks(self):
+        rows = [{'a': i, 'b': f'x,{i}'} for i in range(5)]
+        chunks = list(export_lines(iter(rows), ['a', 'b'], 'csv', chunk_size=2))
+        self.assertEqual(chunks, ['a,b\r\n', '0,"x,0"\r\n1,"x,1"\r\n', '2,"x,2"\r\n3,"x,3"\r\n', '4,"x,4"\r\n'])
@@ -10,6 +10,7 @@ urlpatterns = [
     path('tte-vs-rct/', views.tte_vs_rct, name='tte_vs_rct'),
     path('learning-hub/', views.learning_hub, name='learning_hub'),
     path('analysis/', views.analysis, name='analysis'),
+    path('analysis/tab/<str:tab>/', views.analysis_tab, name='analysis_tab'),
     path('about/', views.about, name='about'),
     path('api-docs/', views.api_documentation, name='api_documentation'),
     
@@ -0,0 +1,57 @@
+"""
+Process warm-up for the analysis pages.
+
+When TTEDB_WARMUP is enabled, gunicorn's `when_ready` hook (see
+gunicorn.conf.py) calls `warm_up()` in the master. The app is preloaded
+and the hook runs before workers fork, so
+the scientific stack is imported once and the forest plot artifacts are
+built once and shared by every worker, instead of the first request on
+each worker paying for both. It queries the database, so it is kept out
+of `AppConfig.ready()`, which also runs for every management command.
+"""
+import importlib
+import logging
+import time
+
+from django.db import connections
+
+
+logger = logging.getLogger(__name__)
+
+# Heavy modules imported lazily on the analysis code paths
+WARMUP_MODULES = [
+    'numpy',
+    'scipy.stats',
+    'plotly.graph_objects',
+    'plotly.offline',
+]
+
+
+def warm_up():
+    """Import the scientific stack and prebuild the forest plot artifacts"""
+    from .forest_plots import EFFECT_MEASURES, get_forest_plot_columns, get_forest_plots
+
+    timings = {}
+    start = time.perf_counter()
+    for module in WARMUP_MODULES:
+        importlib.import_module(module)
+    timings['imports'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    try:
+        for measure in EFFECT_MEASURES:
+            get_forest_plot_columns(measure)
+        get_forest_plots()
+    except Exception:
+        # A missing table or export must not keep the server from starting
+        logger.exception('Warm-up could not prebuild the forest plot artifacts')
+    finally:
+        # Never hand a database connection opened here to forked workers
+        connections.close_all()
+    timings['forest_plots'] = time.perf_counter() - start
+
+    logger.info(
+        'Warm-up finished: imports %.2fs, forest plots %.2fs',
+        timings['imports'], timings['forest_plots']
+    )
+    return timings
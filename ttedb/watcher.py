@@ -0,0 +1,120 @@
+"""
+Watcher that bumps the dataset generation when the exports change.
+
+It watches ttedb/data/ for written, moved or deleted JSON exports and
+for switches of the ACTIVE version. inotify is used on Linux when the
+optional `inotify_simple` package is installed. Otherwise the directory
+is polled: a file is only re-hashed when its stat() changes, and the
+stat includes the inode and ctime, so copies which keep the old mtime
+and size are noticed as well, while rewrites with the same content are
+not counted as changes. Changes arriving together (the R
+scripts write several files in a row) are coalesced into one bump once
+the directory has been quiet for the debounce interval.
+
+Run it with `python manage.py watch_analysis_exports`, or let
+gunicorn.conf.py start it in the master process.
+"""
+import glob
+import hashlib
+import logging
+import os
+import threading
+
+from .artifacts import ACTIVE_VERSION_FILENAME, bump_generation, data_dir
+
+try:
+    import inotify_simple
+except ImportError:
+    inotify_simple = None
+
+
+logger = logging.getLogger(__name__)
+
+POLL_INTERVAL = 2
+DEBOUNCE_INTERVAL = 1
+
+
+def is_watched(filename):
+    return filename.endswith('.json') or filename == ACTIVE_VERSION_FILENAME
+
+
+def directory_snapshot(previous=None):
+    """
+    (stat, content hash) of every watched file in ttedb/data, reusing the
+    hashes of a previous snapshot for files whose stat is unchanged
+    """
+    previous = previous or {}
+    snapshot = {}
+    for path in glob.glob(os.path.join(data_dir(), '*')):
+        if not is_watched(os.path.basename(path)):
+            continue
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            continue
+        if not os.path.isfile(path):
+            continue
+        stat = (st.st_ino, st.st_size, st.st_mtime_ns, st.st_ctime_ns)
+        if path in previous and previous[path][0] == stat:
+            snapshot[path] = previous[path]
+            continue
+        try:
+            with open(path, 'rb') as f:
+                snapshot[path] = (stat, hashlib.sha256(f.read()).digest())
+        except FileNotFoundError:
+            continue
+    return snapshot
+
+
+def contents_changed(previous, snapshot):
+    return {path: digest for path, (_, digest) in previous.items()} != {
+        path: digest for path, (_, digest) in snapshot.items()
+    }
+
+
+def poll_changes(stop, interval=POLL_INTERVAL):
+    """Yield once per poll in which the watched files changed"""
+    previous = directory_snapshot()
+    while not stop.wait(interval):
+        snapshot = directory_snapshot(previous)
+        changed = contents_changed(previous, snapshot)
+        previous = snapshot
+        if changed:
+            yield
+
+
+def inotify_changes(stop, interval=POLL_INTERVAL):
+    """Yield once per batch of inotify events on watched files"""
+    flags = inotify_simple.flags
+    with inotify_simple.INotify() as inotify:
+        inotify.add_watch(data_dir(), flags.CLOSE_WRITE | flags.MOVED_TO | flags.DELETE)
+        while not stop.is_set():
+            events = inotify.read(timeout=interval * 1000)
+            if any(is_watched(event.name) for event in events):
+                yield
+
+
+def watch_exports(stop=None, interval=POLL_INTERVAL, debounce=DEBOUNCE_INTERVAL):
+    """Bump the dataset generation after every change until stop is set"""
+    stop = stop or threading.Event()
+    changes = inotify_changes if inotify_simple else poll_changes
+    logger.info('Watching %s for analysis export changes (%s)', data_dir(), changes.__name__)
+
+    for _ in changes(stop, interval):
+        # Let a burst of writes finish before signalling the workers
+        snapshot = directory_snapshot()
+        while not stop.wait(debounce):
+            previous, snapshot = snapshot, directory_snapshot(snapshot)
+            if not contents_changed(previous, snapshot):
+                break
+        if stop.is_set():
+            break
+        generation = bump_generation()
+        logger.info('Analysis exports changed; dataset generation is now %d', generation)
+
+
+def start_watcher_thread():
+    """Run watch_exports() in a daemon thread and return its stop event"""
+    stop = threading.Event()
+    threading.Thread(target=watch_exports, args=(stop,), name='ttedb-export-watcher', daemon=True).start()
+    return stop
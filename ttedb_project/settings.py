@@ -48,6 +48,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'ttedb.middleware.DatasetGenerationMiddleware',
 ]
 
 ROOT_URLCONF = 'ttedb_project.urls'
@@ -92,6 +93,27 @@ if DEBUG and config('USE_SQLITE', default=False, cast=bool):
         }
     }
 
+# Cache shared by all workers on the host (rendered forest plots, etc.).
+# Point CACHE_BACKEND/CACHE_LOCATION at Redis or Memcached for multi-host deployments.
+CACHES = {
+    'default': {
+        'BACKEND': config('CACHE_BACKEND', default='django.core.cache.backends.filebased.FileBasedCache'),
+        'LOCATION': config('CACHE_LOCATION', default=str(BASE_DIR / '.cache')),
+    }
+}
+
+# Import the scientific stack and prebuild analysis artifacts in the gunicorn
+# master before workers fork (enabled and run by gunicorn.conf.py)
+TTEDB_WARMUP = config('TTEDB_WARMUP', default=False, cast=bool)
+
+# Drop cached analysis exports when the dataset generation changes, checked
+# at most this often (seconds); the generation is bumped by publish_analysis,
+# refresh_forest_data and the export watcher
+TTEDB_GENERATION_CHECK_INTERVAL = config('TTEDB_GENERATION_CHECK_INTERVAL', default=2, cast=float)
+
+# Run the export watcher in the gunicorn master (enabled by gunicorn.conf.py)
+TTEDB_WATCH_EXPORTS = config('TTEDB_WATCH_EXPORTS', default=False, cast=bool)
+
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
     {